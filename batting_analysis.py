@@ -1,96 +1,44 @@
-import sqlite3
 from collections import defaultdict
 import matplotlib.pyplot as plt
-import numpy as np
-from search_player import get_player_batting_pas_by_id, get_player_by_id
+from search_player import (get_player_batting_pas_by_id, get_player_by_id, get_team_player_ids,
+                           query_plate_appearances)
 from helpers import get_result_color, calculate_delta
+from pa_columns import load_player_columns
+from player_profile import get_player_profile, VALUE_BUCKETS, DELTA_BUCKETS
+from chart_templates import BarFigure, BarPanel, MatrixFigure, MatrixPanel
 import statistics
-from getData import PlateAppearance
 
 def get_swing_distribution(player_id):
-    """Returns distribution of swings in 200-number buckets"""
-    pas = get_player_batting_pas_by_id(player_id)
-    buckets = defaultdict(int)
-    
-    # Initialize all buckets from 1-1000 in steps of 200
-    for i in range(0, 1001, 100):
-        buckets[i] = 0
-    
-    for pa in pas:
-        if pa.swing is not None:
-            bucket = ((pa.swing - 1) // 100) * 100
-            bucket = max(0, min(900, bucket))  # Clamp to 0-900
-            buckets[bucket] += 1
-    
-    total = sum(buckets.values())
-    if total == 0:
-        return {}
-    
-    return {bucket: (count/total)*100 for bucket, count in sorted(buckets.items())}
+    """Returns distribution of swings in 100-number buckets"""
+    return dict(get_player_profile(player_id, 'batting').distribution)
 
 def get_delta_history(player_id):
     """Returns chronological list of deltas between consecutive swings"""
-    pas = get_player_batting_pas_by_id(player_id)
-    # Sort by paID to get chronological order
-    sorted_pas = sorted(pas, key=lambda x: x.paID)
-    
-    deltas = []
-    for i in range(len(sorted_pas)-1):
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        if pa1.swing is not None and pa2.swing is not None:
-            delta = calculate_delta(pa1.swing, pa2.swing)
-            deltas.append(delta)
-    
-    return deltas
+    return list(get_player_profile(player_id, 'batting').delta_history)
 
 def get_first_swings(player_id):
     """Returns list of first swings in each game"""
-    pas = get_player_batting_pas_by_id(player_id)
-    games = defaultdict(list)
-    
-    # Group PAs by game
-    for pa in pas:
-        if pa.gameID and pa.swing:
-            games[pa.gameID].append(pa)
-    
-    # Get first PA from each game
-    first_swings = []
-    for game_pas in games.values():
-        sorted_game_pas = sorted(game_pas, key=lambda x: x.paID)
-        if sorted_game_pas:
-            first_swings.append(sorted_game_pas[0].swing)
-    
-    return first_swings
+    return list(get_player_profile(player_id, 'batting').first_values)
 
 def get_delta_distribution(player_id):
     """Returns distribution of deltas in 50-number buckets from -450 to 500"""
-    deltas = get_delta_history(player_id)
-    buckets = defaultdict(int)
-    
-    # Initialize buckets from -450 to 450 in steps of 50, plus special 451-500 bucket
-    for i in range(-450, 451, 50):
-        buckets[i] = 0
-    buckets[451] = 0  # Special bucket for 451-500
-    
-    for delta in deltas:
-        if delta > 450:
-            # Special case for 451-500
-            buckets[451] += 1
-        else:
-            # Round to nearest 50
-            bucket = (delta // 50) * 50
-            # Clamp to our range
-            bucket = max(-450, min(450, bucket))
-            buckets[bucket] += 1
-    
-    total = sum(buckets.values())
-    if total == 0:
-        return {}
-    
-    return {bucket: (count/total)*100 for bucket, count in sorted(buckets.items())}
+    return dict(get_player_profile(player_id, 'batting').delta_distribution)
+
+# Buckets and labels shared by the chart layouts below
+SWING_BUCKETS = VALUE_BUCKETS['batting']
+DIFF_RANGES = [f'{i*50}-{(i+1)*50-1}' for i in range(10)]
+SWING_RANGES = [f'{i*100+1}-{(i+1)*100}' for i in range(10)]
+DELTA_RANGES = [f'{-499+i*100}-{-400+i*100}' for i in range(10)]
+
+DISTRIBUTION_PANELS = [
+    BarPanel('Swing Distribution', 'Swing Range', 'Percentage', SWING_BUCKETS,
+             [f'{b+1}-{b+100}' for b in SWING_BUCKETS], 80, False),
+    BarPanel('Delta Distribution', 'Delta Range', 'Percentage', DELTA_BUCKETS,
+             [f'{b} to {b+49}' if b != 451 else '451 to 500' for b in DELTA_BUCKETS], 40, True),
+]
 
-def plot_distributions(player_id):
+def plot_distributions(player_id, figure=None):
+    """Draw swing and delta distributions into figure (a new BarFigure by default). Returns the Figure"""
     player = get_player_by_id(player_id)
     if not player:
         return None
@@ -99,43 +47,14 @@ def plot_distributions(player_id):
     print(f"\nPlotting distributions for {player.playerName}")
     
     # Get distributions
-    dist = get_swing_distribution(player_id)
-    delta_dist = get_delta_distribution(player_id)
+    profile = get_player_profile(player_id, 'batting')
+    dist = profile.distribution
+    delta_dist = profile.delta_distribution
     print(f"Swing distribution: {dist}")
     print(f"Delta distribution: {delta_dist}")
     
-    # Create figure
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 12))
-    fig.suptitle(f'Distributions for {player.playerName}')
-    
-    # Plot swing distribution
-    buckets = list(dist.keys())
-    percentages = list(dist.values())
-    ax1.bar(buckets, percentages, width=80)
-    ax1.set_title('Swing Distribution')
-    ax1.set_xlabel('Swing Range')
-    ax1.set_ylabel('Percentage')
-    ax1.set_xticks(buckets)
-    ax1.set_xticklabels([f'{b+1}-{b+100}' for b in buckets], rotation=45)
-    
-    # Plot delta distribution
-    buckets = list(delta_dist.keys())
-    percentages = list(delta_dist.values())
-    ax2.bar(buckets, percentages, width=40)  # Reduced width since buckets are smaller
-    ax2.set_title('Delta Distribution')
-    ax2.set_xlabel('Delta Range')
-    ax2.set_ylabel('Percentage')
-    ax2.set_xticks(buckets)
-    ax2.set_xticklabels([
-        f'{b} to {b+49}' if b != 451 else '451 to 500'
-        for b in buckets
-    ], rotation=45)
-    
-    # Add gridlines for better readability
-    ax2.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    return fig  # Return the figure instead of closing it
+    figure = figure or BarFigure(DISTRIBUTION_PANELS)
+    return figure.update(f'Distributions for {player.playerName}', [dist, delta_dist]).fig
 
 def print_distributions(player_id):
     player = get_player_by_id(player_id)
@@ -164,7 +83,7 @@ def plot_histories(player_id):
     if not player:
         return
         
-    pas = get_player_batting_pas_by_id(player_id)
+    pas = query_plate_appearances(player_id, 'batting')
     sorted_pas = sorted(pas, key=lambda x: x.paID)[-25:]  # Last 25 PAs
     
     # Create figure with two subplots
@@ -215,36 +134,7 @@ def plot_histories(player_id):
 
 def get_diff_swing_distribution(player_id):
     """Returns distribution of swings following specific diffs (0-500)"""
-    pas = get_player_batting_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: (x.gameID, x.paID))
-    
-    # Create a 10x10 matrix for ranges
-    matrix = np.zeros((10, 10))
-    
-    for i in range(len(sorted_pas)-1):
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        
-        # Only consider consecutive PAs in same game
-        if (pa1.gameID == pa2.gameID and 
-            pa1.diff is not None and pa2.swing is not None):
-            
-            # Get diff bucket (previous diff, 0-500 in steps of 50)
-            diff_bucket = (pa1.diff // 50)
-            diff_bucket = max(0, min(9, diff_bucket))
-            
-            # Get swing bucket (next swing)
-            swing_bucket = ((pa2.swing - 1) // 100)
-            swing_bucket = max(0, min(9, swing_bucket))
-            
-            matrix[diff_bucket][swing_bucket] += 1
-    
-    # Convert to percentages by row
-    row_sums = matrix.sum(axis=1, keepdims=True)
-    row_sums[row_sums == 0] = 1  # Avoid division by zero
-    matrix = (matrix / row_sums) * 100
-    
-    return matrix
+    return get_player_profile(player_id, 'batting').diff_value_matrix.copy()
 
 def plot_diff_swing_matrix(player_id):
     player = get_player_by_id(player_id)
@@ -283,7 +173,7 @@ def print_histories(player_id):
     if not player:
         return
         
-    pas = get_player_batting_pas_by_id(player_id)
+    pas = query_plate_appearances(player_id, 'batting')
     sorted_pas = sorted(pas, key=lambda x: x.paID)[-10:]  # Last 10 PAs
     
     print(f"\nRecent History for {player.playerName}")
@@ -303,70 +193,11 @@ def print_histories(player_id):
 
 def get_swing_swing_distribution(player_id):
     """Returns distribution of swings following specific swings"""
-    pas = get_player_batting_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: (x.gameID, x.paID))
-    
-    # Create a 10x10 matrix for ranges
-    matrix = np.zeros((10, 10))
-    
-    for i in range(len(sorted_pas)-1):
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        
-        # Only consider consecutive PAs in same game
-        if (pa1.gameID == pa2.gameID and 
-            pa1.swing is not None and pa2.swing is not None):
-            
-            # Get swing buckets
-            prev_bucket = ((pa1.swing - 1) // 100)
-            next_bucket = ((pa2.swing - 1) // 100)
-            prev_bucket = max(0, min(9, prev_bucket))
-            next_bucket = max(0, min(9, next_bucket))
-            
-            matrix[prev_bucket][next_bucket] += 1
-    
-    # Convert to percentages by row
-    row_sums = matrix.sum(axis=1, keepdims=True)
-    row_sums[row_sums == 0] = 1  # Avoid division by zero
-    matrix = (matrix / row_sums) * 100
-    
-    return matrix
+    return get_player_profile(player_id, 'batting').value_value_matrix.copy()
 
 def get_delta_delta_distribution(player_id):
     """Returns distribution of deltas following specific deltas"""
-    pas = get_player_batting_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: (x.gameID, x.paID))
-    
-    # Create a 10x10 matrix for ranges
-    matrix = np.zeros((10, 10))
-    
-    for i in range(len(sorted_pas)-2):  # Need 3 PAs to get two consecutive deltas
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        pa3 = sorted_pas[i+2]
-        
-        # Only consider consecutive PAs in same game
-        if (pa1.gameID == pa2.gameID == pa3.gameID and 
-            pa1.swing is not None and pa2.swing is not None and pa3.swing is not None):
-            
-            # Calculate deltas
-            delta1 = calculate_delta(pa1.swing, pa2.swing)
-            delta2 = calculate_delta(pa2.swing, pa3.swing)
-            
-            # Get delta buckets
-            prev_bucket = ((delta1 + 499) // 100)  # Changed from +500 to +499
-            next_bucket = ((delta2 + 499) // 100)  # Changed from +500 to +499
-            prev_bucket = max(0, min(9, prev_bucket))
-            next_bucket = max(0, min(9, next_bucket))
-            
-            matrix[prev_bucket][next_bucket] += 1
-    
-    # Convert to percentages by row
-    row_sums = matrix.sum(axis=1, keepdims=True)
-    row_sums[row_sums == 0] = 1  # Avoid division by zero
-    matrix = (matrix / row_sums) * 100
-    
-    return matrix
+    return get_player_profile(player_id, 'batting').delta_delta_matrix.copy()
 
 def plot_swing_swing_matrix(player_id):
     player = get_player_by_id(player_id)
@@ -436,7 +267,7 @@ def plot_game_sequences(player_id, num_games=5):
     if not player:
         return
     
-    pas = get_player_batting_pas_by_id(player_id)
+    pas = query_plate_appearances(player_id, 'batting')
     
     # Group PAs by game
     games = defaultdict(list)
@@ -515,7 +346,7 @@ def plot_game_sequences_overlay(player_id, num_games=5):
     if not player:
         return None
     
-    pas = get_player_batting_pas_by_id(player_id)
+    pas = query_plate_appearances(player_id, 'batting')
     
     # Group PAs by game
     games = defaultdict(list)
@@ -573,128 +404,50 @@ def plot_game_sequences_overlay(player_id, num_games=5):
     plt.tight_layout()
     return fig  # Return the figure instead of closing it
 
-def plot_matrices(player_id):
-    """Plot all distribution matrices"""
+MATRIX_PANELS = [
+    MatrixPanel('Previous Diff to Next Swing', 'Next Swing Range', 'Previous Diff Range', SWING_RANGES, DIFF_RANGES),
+    MatrixPanel('Previous Swing to Next Swing', 'Next Swing Range', 'Previous Swing Range', SWING_RANGES, SWING_RANGES),
+    MatrixPanel('Previous Delta to Next Delta', 'Next Delta Range', 'Previous Delta Range', DELTA_RANGES, DELTA_RANGES),
+]
+
+def get_matrices(player_id):
+    """The three pattern matrices, in MATRIX_PANELS order"""
+    profile = get_player_profile(player_id, 'batting')
+    return [
+        profile.diff_value_matrix.copy(),
+        profile.value_value_matrix.copy(),
+        profile.delta_delta_matrix.copy(),
+    ]
+
+def plot_matrices(player_id, figure=None):
+    """Plot all distribution matrices into figure (a new MatrixFigure by default). Returns the Figure"""
     player = get_player_by_id(player_id)
     if not player:
         return None
-        
-    # Create figure with 2x2 subplots
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(20, 16))
-    fig.suptitle(f'Pattern Analysis for {player.playerName}')
-    
-    # Diff to Next Swing
-    matrix = get_diff_swing_distribution(player_id)
-    im1 = ax1.imshow(matrix, cmap='YlOrRd')
-    ax1.set_title('Previous Diff to Next Swing')
-    ax1.set_xlabel('Next Swing Range')
-    ax1.set_ylabel('Previous Diff Range')
-    
-    # Add numbers to cells
-    for i in range(10):
-        for j in range(10):
-            ax1.text(j, i, f'{matrix[i, j]:.0f}', ha='center', va='center')
-    
-    # Labels
-    diff_ranges = [f'{i*50}-{(i+1)*50-1}' for i in range(10)]
-    swing_ranges = [f'{i*100+1}-{(i+1)*100}' for i in range(10)]
-    ax1.set_xticks(range(10))
-    ax1.set_yticks(range(10))
-    ax1.set_xticklabels(swing_ranges, rotation=45, ha='right')
-    ax1.set_yticklabels(diff_ranges)
     
-    # Swing to Next Swing
-    matrix = get_swing_swing_distribution(player_id)
-    im2 = ax2.imshow(matrix, cmap='YlOrRd')
-    ax2.set_title('Previous Swing to Next Swing')
-    ax2.set_xlabel('Next Swing Range')
-    ax2.set_ylabel('Previous Swing Range')
-    
-    # Add numbers to cells
-    for i in range(10):
-        for j in range(10):
-            ax2.text(j, i, f'{matrix[i, j]:.0f}', ha='center', va='center')
-    
-    ax2.set_xticks(range(10))
-    ax2.set_yticks(range(10))
-    ax2.set_xticklabels(swing_ranges, rotation=45, ha='right')
-    ax2.set_yticklabels(swing_ranges)
-    
-    # Delta to Delta
-    matrix = get_delta_delta_distribution(player_id)
-    im3 = ax3.imshow(matrix, cmap='YlOrRd')
-    ax3.set_title('Previous Delta to Next Delta')
-    ax3.set_xlabel('Next Delta Range')
-    ax3.set_ylabel('Previous Delta Range')
-    
-    # Add numbers to cells
-    for i in range(10):
-        for j in range(10):
-            ax3.text(j, i, f'{matrix[i, j]:.0f}', ha='center', va='center')
-    
-    delta_ranges = [f'{-499+i*100}-{-400+i*100}' for i in range(10)]
-    ax3.set_xticks(range(10))
-    ax3.set_yticks(range(10))
-    ax3.set_xticklabels(delta_ranges, rotation=45, ha='right')
-    ax3.set_yticklabels(delta_ranges)
-    
-    # Add colorbars
-    plt.colorbar(im1, ax=ax1, label='Percentage')
-    plt.colorbar(im2, ax=ax2, label='Percentage')
-    plt.colorbar(im3, ax=ax3, label='Percentage')
-    
-    # Remove the empty subplot
-    ax4.remove()
-    
-    plt.tight_layout()
-    return fig  # Return the figure instead of closing it
+    figure = figure or MatrixFigure(MATRIX_PANELS)
+    return figure.update(f'Pattern Analysis for {player.playerName}', get_matrices(player_id)).fig
 
 def predict_next_swing(player_id, prev_swing=None, prev_diff=None):
     """Predict next swing based on player and team patterns using sliding windows"""
-    pas = get_player_batting_pas_by_id(player_id)
+    columns = load_player_columns(player_id, 'batting')
     player = get_player_by_id(player_id)
     if not player or not player.Team:
         return None, 0, 0
         
-    # Get all team PAs
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    c.execute('''
-        SELECT 
-            pa.paID, pa.gameID, pa.inning, pa.outs, pa.pitcherID, pa.hitterID,
-            pa.pitch, pa.swing, pa.diff, pa.result, pa.exactResult, pa.oldResult,
-            pa.pitchType, pa.pitchSpeed, pa.pitchMovement, pa.pitchLocation,
-            pa.pitchSpin, pa.pitchAngle, pa.pitchConfidence, pa.batterTiming,
-            pa.batterContact, pa.batterPower, pa.batterEye, pa.batterConfidence,
-            pa.inningScore, pa.gameScore, pa.leverageIndex, pa.weather,
-            pa.stadium, pa.temperature, pa.windSpeed, pa.windDirection,
-            pa.humidity, pa.fieldCondition
-        FROM plate_appearances pa
-        JOIN players p ON pa.hitterID = p.playerID
-        WHERE p.Team = ? AND pa.hitterID != ?
-        ORDER BY pa.paID
-    ''', (player.Team, player_id))
-    team_pas = [PlateAppearance(*row) for row in c.fetchall()]
-    conn.close()
+    # Get all team PAs (the other hitters on the player's current team). Asks
+    # the players table each time: get_roster() is cached per process, and
+    # this runs in a worker that syncs never invalidate
+    teammates = [pid for pid in get_team_player_ids(player.Team) if pid != player_id]
+    team_pas = query_plate_appearances(teammates, 'batting', ('paID', 'gameID', 'hitterID', 'swing'))
     
     # Sort PAs chronologically
-    sorted_player_pas = sorted(pas, key=lambda x: x.paID)
     sorted_team_pas = sorted(team_pas, key=lambda x: x.paID)
     
-    # Get sequences of 3 consecutive swings
-    player_sequences = []
+    # Get sequences of 3 consecutive swings, oldest first so later ones weigh more
+    player_sequences = columns.sequences('swing', 'swing', 'swing', chronological=True)
+    diff_sequences = columns.sequences('diff', 'swing', 'swing', chronological=True)
     team_sequences = []
-    diff_sequences = []
-    
-    # Get player sequences
-    for i in range(len(sorted_player_pas)-2):
-        pa1, pa2, pa3 = sorted_player_pas[i:i+3]
-        
-        if (pa1.gameID == pa2.gameID == pa3.gameID):
-            if all(pa.swing is not None for pa in [pa1, pa2, pa3]):
-                player_sequences.append((pa1.swing, pa2.swing, pa3.swing))
-            if pa1.diff is not None and all(pa.swing is not None for pa in [pa2, pa3]):
-                diff_sequences.append((pa1.diff, pa2.swing, pa3.swing))
     
     # Get team sequences (from other players)
     for i in range(len(sorted_team_pas)-2):
@@ -750,10 +503,7 @@ def predict_next_swing(player_id, prev_swing=None, prev_diff=None):
     if total_weight == 0:
         # Use overall distribution with recency weighting
         all_sequences = (
-            [(pa1.swing, pa2.swing, pa3.swing) 
-             for pa1, pa2, pa3 in zip(sorted_player_pas[:-2], sorted_player_pas[1:-1], sorted_player_pas[2:])
-             if pa1.gameID == pa2.gameID == pa3.gameID 
-             and all(pa.swing is not None for pa in [pa1, pa2, pa3])] +
+            player_sequences +
             [(pa1.swing, pa2.swing, pa3.swing)
              for pa1, pa2, pa3 in zip(sorted_team_pas[:-2], sorted_team_pas[1:-1], sorted_team_pas[2:])
              if pa1.gameID == pa2.gameID == pa3.gameID
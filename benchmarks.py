@@ -0,0 +1,320 @@
+"""Micro-benchmarks and regression checks for the ingestion and analysis paths.
+
+Run one with e.g. `python benchmarks.py writes --rows 20000`.
+Every benchmark works in a scratch directory and never touches ./baseball.db.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import sqlite3
+from contextlib import contextmanager
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import db
+import getData
+import batting_analysis
+import pa_columns
+import pitching_analysis
+import search_player
+from chart_templates import BarFigure, MatrixFigure, DEFAULT_DPI
+from fixtures import ReplayServer, generate_league, scale_league
+from models import PlateAppearance, PA_FIELDS
+
+@contextmanager
+def scratch_db():
+    """Chdir into a temporary directory holding a fresh baseball.db"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            getData.init_db()
+            yield os.path.join(tmp, 'baseball.db')
+        finally:
+            db.close_all()
+            os.chdir(cwd)
+
+def synthetic_plate_appearances(count, player_id=1, start_pa_id=1):
+    """Deterministic plate appearances for a single batter"""
+    pas = []
+    for i in range(count):
+        pa_id = start_pa_id + i
+        pas.append(PlateAppearance(
+            pa_id, 'mlr', 1 + i // 2000, 1 + (i // 100) % 20, f'g{i // 25}',
+            'T1', i % 9, i % 25, i % 3, '0', 0, 0,
+            'AAA', 'Pitcher', 1000 + i % 50, 'BBB', 'Batter', player_id,
+            (i * 37) % 1000 + 1, (i * 53) % 1000 + 1, (i * 11) % 500,
+            'K', 'K', 'K', 'K', 0, 0, 0.01, -0.01, None, None, None, None
+        ))
+    return pas
+
+def bench_writes(args):
+    pas = synthetic_plate_appearances(args.rows)
+
+    with scratch_db():
+        conn = sqlite3.connect('baseball.db')
+        start = time.perf_counter()
+        for pa_obj in pas:
+            # The pre-batching write path: one statement and one commit per row
+            conn.execute(getData.PA_INSERT_SQL, getData.plate_appearance_row(pa_obj, 'batting'))
+            conn.commit()
+        before = time.perf_counter() - start
+        conn.close()
+
+    with scratch_db():
+        conn = sqlite3.connect('baseball.db')
+        start = time.perf_counter()
+        getData.save_plate_appearances(pas, 'batting', conn, batch_size=args.batch_size)
+        after = time.perf_counter() - start
+        conn.close()
+
+    print(f"Rows: {args.rows}")
+    print(f"Per-row commit: {args.rows / before:,.0f} rows/sec ({before:.2f}s)")
+    print(f"Batched writer: {args.rows / after:,.0f} rows/sec ({after:.2f}s, batch size {args.batch_size})")
+    print(f"Speedup: {before / after:.1f}x")
+
+def bench_ingest(args):
+    """Full sync of a fixture league served locally by ReplayServer"""
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir = args.fixture_dir
+        if fixture_dir is None:
+            fixture_dir = os.path.join(tmp, 'league')
+            generate_league(fixture_dir, args.players, args.games)
+        if args.scale > 1:
+            scaled_dir = os.path.join(tmp, 'scaled')
+            scale_league(fixture_dir, scaled_dir, args.scale)
+            fixture_dir = scaled_dir
+
+        with ReplayServer(fixture_dir, args.latency, args.jitter, args.error_rate, seed=0) as server:
+            with scratch_db():
+                fetcher = getData.configure_fetcher(server.base_url, args.workers, 0,
+                                                    cache_dir=None, backoff=0.05)
+                start = time.perf_counter()
+                getData.getPlayers(fetcher)
+                elapsed = time.perf_counter() - start
+                with db.reader() as conn:
+                    pas = conn.execute('SELECT COUNT(*) FROM plate_appearances').fetchone()[0]
+                    players = conn.execute('SELECT COUNT(*) FROM players').fetchone()[0]
+                fetcher.close()
+
+    stats = server.stats
+    print(f"Players: {players}, PAs: {pas}, workers: {args.workers}, latency: {args.latency}s")
+    print(f"Elapsed: {elapsed:.2f}s")
+    print(f"Throughput: {pas / elapsed:,.0f} PAs/sec, {stats['requests'] / elapsed:,.1f} requests/sec, "
+          f"{stats['bytes'] / elapsed / 1e6:.1f} MB/sec")
+    print(f"Server: {stats['requests']} requests, {stats['errors']} injected errors")
+
+def bench_charts(args):
+    """Chart rendering on fixed data: a fresh figure with tight layout vs a reused template"""
+    rng = np.random.default_rng(0)
+    matrices = [rng.random((10, 10)) * 100 for _ in pitching_analysis.MATRIX_PANELS]
+    distributions = [{bucket: rng.random() * 20 for bucket in panel.buckets}
+                     for panel in pitching_analysis.DISTRIBUTION_PANELS]
+    cases = [
+        ('matrices', lambda dpi: MatrixFigure(pitching_analysis.MATRIX_PANELS, dpi=dpi), matrices),
+        ('distributions', lambda dpi: BarFigure(pitching_analysis.DISTRIBUTION_PANELS, dpi), distributions),
+    ]
+    
+    for name, factory, data in cases:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            # The pre-template path: build everything, tight_layout, then a tight bbox save
+            figure = factory(DEFAULT_DPI).update('Benchmark', data)
+            figure.fig.tight_layout()
+            figure.fig.savefig(io.BytesIO(), format='png', bbox_inches='tight')
+            figure.close()
+        before = (time.perf_counter() - start) / args.repeat
+        
+        template = factory(args.dpi)
+        template.update('Benchmark', data).to_png()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            template.update('Benchmark', data).to_png()
+        after = (time.perf_counter() - start) / args.repeat
+        template.close()
+        
+        print(f"{name}: per-figure {before * 1000:.0f} ms, template {after * 1000:.0f} ms "
+              f"at {args.dpi} dpi ({before / after:.1f}x)")
+
+def legacy_model(name, fields):
+    """The pre-tuple model: a plain class assigning every field in __init__"""
+    body = '\n'.join(f'        self.{field} = {field}' for field in fields)
+    namespace = {}
+    exec(f"class {name}:\n    def __init__(self, {', '.join(fields)}):\n{body}\n", namespace)
+    return namespace[name]
+
+def bench_models(args):
+    """Loading one player's PAs: plain objects built by hand vs tuple rows from a row factory"""
+    LegacyPlateAppearance = legacy_model('PlateAppearance', PA_FIELDS)
+
+    def load_legacy():
+        with db.reader() as conn:
+            rows = conn.execute(f"{search_player.PA_SELECT} WHERE pa.hitterID = ? "
+                                "ORDER BY pa.season DESC, pa.session DESC", (1,)).fetchall()
+        return [LegacyPlateAppearance(*row) for row in rows]
+
+    def load_tuples():
+        return search_player.get_player_batting_pas_by_id(1)
+
+    def load_projected():
+        return search_player.query_plate_appearances(1, 'batting')
+
+    with scratch_db():
+        with db.writer() as conn:
+            getData.save_plate_appearances(synthetic_plate_appearances(args.rows), 'batting', conn)
+            rows = conn.execute(f'{search_player.PA_SELECT}').fetchall()
+            columns = search_player.ANALYSIS_COLUMNS
+            projected = conn.execute(f"SELECT {', '.join(columns)} FROM plate_appearances").fetchall()
+        
+        print(f"PAs: {args.rows}")
+        cases = (
+            ('plain objects', load_legacy, lambda: [LegacyPlateAppearance(*row) for row in rows]),
+            ('tuple rows', load_tuples, lambda: list(map(PlateAppearance._make, rows))),
+            ('analysis columns', load_projected,
+             lambda: list(map(search_player.row_type(columns)._make, projected))),
+        )
+        for name, load, build in cases:
+            timings = []
+            for fn in (build, load):
+                fn()
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    fn()
+                timings.append((time.perf_counter() - start) / args.repeat)
+            
+            tracemalloc.start()
+            pas = build()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del pas
+            print(f"{name}: construct {timings[0] * 1000:.0f} ms, query+construct {timings[1] * 1000:.0f} ms, "
+                  f"{size / 1e6:.1f} MB over the raw rows ({size / args.rows:.0f} bytes/PA)")
+
+def bench_analysis(args):
+    """Data for a batter's distribution and matrix charts: cold (query + profile) vs cached"""
+    with scratch_db():
+        with db.writer() as conn:
+            getData.save_plate_appearances(synthetic_plate_appearances(args.rows), 'batting', conn)
+        
+        def charts_data():
+            return batting_analysis.get_matrices(1), batting_analysis.get_swing_distribution(1), \
+                batting_analysis.get_delta_distribution(1)
+        
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            pa_columns._cache.clear()
+            charts_data()
+        cold = (time.perf_counter() - start) / args.repeat
+        
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            charts_data()
+        warm = (time.perf_counter() - start) / args.repeat
+    
+    print(f"PAs: {args.rows}")
+    print(f"Cold: {cold * 1000:.1f} ms (load columns, build profile)")
+    print(f"Cached: {warm * 1000:.2f} ms")
+
+# Hot per-player queries and the index each one must be served by
+PLAN_CHECKS = [
+    ('analysis columns by batter', '''
+        SELECT pa.paID, pa.gameID, pa.pitch, pa.swing, pa.diff FROM plate_appearances pa
+        WHERE pa.hitterID IN (?) AND pa.pa_type IN ('pitching', 'batting') AND pa.season >= ?
+        ORDER BY pa.season DESC, pa.session DESC
+    ''', (1, 1), ['COVERING INDEX idx_pa_hitter_columns']),
+    ('analysis columns by pitcher', '''
+        SELECT pa.paID, pa.gameID, pa.pitch, pa.swing, pa.diff FROM plate_appearances pa
+        WHERE pa.pitcherID IN (?) AND pa.pa_type IN ('pitching', 'batting') AND pa.outs = ?
+        ORDER BY pa.season DESC, pa.session DESC
+    ''', (1000, 2), ['COVERING INDEX idx_pa_pitcher_columns']),
+    ('batting PAs by player', '''
+        SELECT * FROM plate_appearances pa
+        WHERE pa.hitterID = ? AND (pa.pa_type = 'pitching' OR pa.pa_type = 'batting')
+        ORDER BY pa.season DESC, pa.session DESC
+    ''', (1,), ['idx_pa_hitter_columns']),
+    ('pitching PAs by player', '''
+        SELECT * FROM plate_appearances pa
+        WHERE pa.pitcherID = ? AND (pa.pa_type = 'pitching' OR pa.pa_type = 'batting')
+        ORDER BY pa.season DESC, pa.session DESC
+    ''', (1000,), ['idx_pa_pitcher_columns']),
+    ('player exists', '''
+        SELECT 1 FROM plate_appearances WHERE (hitterID = ? OR pitcherID = ?) LIMIT 1
+    ''', (1, 1), ['idx_pa_hitter_columns', 'idx_pa_pitcher_columns']),
+    ('stored paIDs for a feed', '''
+        SELECT paID FROM plate_appearances WHERE hitterID = ?
+    ''', (1,), ['idx_pa_hitter_columns']),
+    ('PAs in a game', '''
+        SELECT * FROM plate_appearances WHERE gameID = ?
+    ''', ('g1',), ['idx_pa_game']),
+]
+
+def check_plans(args):
+    """Fail if any hot query stops using its index or needs a temp sort"""
+    failures = 0
+    with scratch_db():
+        conn = sqlite3.connect('baseball.db')
+        per_player = max(1, args.rows // args.players)
+        for player_id in range(1, args.players + 1):
+            pas = synthetic_plate_appearances(per_player, player_id, player_id * per_player)
+            getData.save_plate_appearances(pas, 'batting', conn)
+        conn.execute('ANALYZE')
+        for name, sql, params, indexes in PLAN_CHECKS:
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+            problems = [index for index in indexes if not any(index in step for step in plan)]
+            problems += [step for step in plan if 'TEMP B-TREE' in step]
+            status = 'FAIL' if problems else 'ok'
+            print(f"{status:4} {name}: {' | '.join(plan)}")
+            failures += bool(problems)
+        conn.close()
+    if failures:
+        sys.exit(f"{failures} query plan check(s) failed")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    writes = subparsers.add_parser('writes', help='Plate appearance insert throughput')
+    writes.add_argument('--rows', type=int, default=20000)
+    writes.add_argument('--batch-size', type=int, default=getData.PA_BATCH_SIZE)
+    writes.set_defaults(func=bench_writes)
+
+    ingest = subparsers.add_parser('ingest', help='Full sync against a local replay server')
+    ingest.add_argument('--fixture-dir', help='Recorded fixture to replay (default: synthetic league)')
+    ingest.add_argument('--players', type=int, default=300)
+    ingest.add_argument('--games', type=int, default=400)
+    ingest.add_argument('--scale', type=int, default=1, help='Clone the league this many times')
+    ingest.add_argument('--workers', type=int, default=getData.DEFAULT_MAX_WORKERS)
+    ingest.add_argument('--latency', type=float, default=0.02)
+    ingest.add_argument('--jitter', type=float, default=0.0)
+    ingest.add_argument('--error-rate', type=float, default=0.0)
+    ingest.set_defaults(func=bench_ingest)
+
+    charts = subparsers.add_parser('charts', help='Per-chart render time, fresh figures vs templates')
+    charts.add_argument('--repeat', type=int, default=5)
+    charts.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    charts.set_defaults(func=bench_charts)
+
+    models = subparsers.add_parser('models', help='Memory and load time of PA rows: objects, tuples, projected columns')
+    models.add_argument('--rows', type=int, default=100000)
+    models.add_argument('--repeat', type=int, default=3)
+    models.set_defaults(func=bench_models)
+
+    analysis = subparsers.add_parser('analysis', help='Distribution and matrix data, cold vs cached')
+    analysis.add_argument('--rows', type=int, default=20000)
+    analysis.add_argument('--repeat', type=int, default=5)
+    analysis.set_defaults(func=bench_analysis)
+
+    plans = subparsers.add_parser('plans', help='Assert the per-player queries use their indexes')
+    plans.add_argument('--rows', type=int, default=5000)
+    plans.add_argument('--players', type=int, default=50)
+    plans.set_defaults(func=check_plans)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
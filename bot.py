@@ -7,9 +7,12 @@ import batting_analysis
 import pitching_analysis
 import getData
 import io
-import matplotlib.pyplot as plt
+from functools import partial
 from search_player import search_player_by_name, get_player_by_id
-import sqlite3
+import db
+from charts import ChartCache, ChartService, ChartSpec
+import executors
+from scheduler import RefreshScheduler
 
 # Bot setup
 intents = discord.Intents.default()
@@ -19,6 +22,12 @@ bot = commands.Bot(command_prefix='!', intents=intents)
 # Store active player lookups
 active_lookups = {}
 
+# Background refreshes, most wanted players first
+refresh_scheduler = RefreshScheduler()
+
+# Chart rendering on worker processes, cached until the player's data changes
+chart_service = ChartService(cache=ChartCache(cache_dir='chart_cache'))
+
 @bot.event
 async def on_ready():
     print(f'Logged in as {bot.user.name}')
@@ -28,86 +37,121 @@ async def on_ready():
         print(f"Synced {len(synced)} command(s)")
     except Exception as e:
         print(f"Failed to sync commands: {str(e)}")
+    chart_service.start()
     update_database.start()
+    trickle_refresh.start()
 
 @tasks.loop(hours=24)
 async def update_database():
     """Update database daily"""
     print("Updating database...")
-    getData.main()
+    try:
+        await executors.run_sync(partial(getData.sync, incremental=True, resume=True))
+    except asyncio.TimeoutError:
+        print("Database update is still running after the sync timeout")
+        return
+    except Exception as e:
+        # Any error escaping a tasks.loop body stops the loop for good
+        print(f"Database update failed: {str(e)}")
+        return
     print("Database update complete!")
 
+@tasks.loop(minutes=5)
+async def trickle_refresh():
+    """Refresh the most wanted players a few at a time, within the request budget"""
+    if executors.sync_running():
+        # The sync refreshes every player anyway; a round now would only compete with it
+        return
+    # Re-rank the whole league hourly; lookups jump the queue in between
+    if trickle_refresh.current_loop % 12 == 0:
+        try:
+            await executors.run_io(refresh_scheduler.plan)
+        except Exception as e:
+            # Keep working through the queue from the last plan
+            print(f"Background refresh planning failed: {str(e) or type(e).__name__}")
+    try:
+        refreshed = await executors.run_refresh(refresh_scheduler.run_pending)
+    except asyncio.TimeoutError:
+        return
+    except Exception as e:
+        print(f"Background refresh failed: {str(e)}")
+        return
+    if refreshed:
+        print(f"Background refresh: {refreshed} players ({refresh_scheduler.stats()})")
+
 @bot.tree.command(name="pitcher", description="Set active pitcher for analysis")
-async def set_pitcher(interaction: discord.Interaction, player_name: str):
+@app_commands.describe(force="Re-download the player's history even if it was fetched recently")
+async def set_pitcher(interaction: discord.Interaction, player_name: str, force: bool = False):
     await interaction.response.defer()
     
-    player_id = search_player_by_name(player_name)
+    player_id = await executors.run_io(search_player_by_name, player_name)
     if not player_id:
         await interaction.followup.send(f"Could not find player: {player_name}")
         return
         
-    player = get_player_by_id(player_id)
+    player = await executors.run_io(get_player_by_id, player_id)
     if not player.pitchType:
         await interaction.followup.send(f"{player.playerName} is not a pitcher!")
         return
     
-    # Update player's data
-    conn = sqlite3.connect('baseball.db')
+    refresh_scheduler.touch(player_id)
+    
+    # Update player's data unless it was refreshed recently
     try:
-        await interaction.followup.send(f"Fetching data for {player.playerName}...")
-        getData.getPlayerPitchingPlateAppearances(player_id, conn)
-        getData.getPlayerBattingPlateAppearances(player_id, conn)
-        conn.commit()
+        if force or not await executors.run_io(getData.is_player_fresh, player_id):
+            await interaction.followup.send(f"Fetching data for {player.playerName}...")
+            await executors.run_io(getData.refresh_player, player_id, None, force,
+                                   timeout=executors.REFRESH_TIMEOUT)
         
         # Verify we got data
-        c = conn.cursor()
-        c.execute('SELECT COUNT(*) FROM plate_appearances WHERE pitcherID = ?', (player_id,))
-        count = c.fetchone()[0]
+        count = await executors.run_io(count_plate_appearances, player_id, 'pitcherID')
         if count == 0:
             await interaction.followup.send(f"No pitching data found for {player.playerName}")
             return
             
+    except asyncio.TimeoutError:
+        await interaction.followup.send(f"Timed out fetching data for {player.playerName}, try again shortly")
+        return
     except Exception as e:
         await interaction.followup.send(f"Error updating data: {str(e)}")
         return
-    finally:
-        conn.close()
     
     active_lookups[interaction.user.id] = {'type': 'pitcher', 'id': player_id}
     await interaction.followup.send(f"Set active pitcher to {player.playerName} with {count} plate appearances")
 
 @bot.tree.command(name="batter", description="Set active batter for analysis")
-async def set_batter(interaction: discord.Interaction, player_name: str):
+@app_commands.describe(force="Re-download the player's history even if it was fetched recently")
+async def set_batter(interaction: discord.Interaction, player_name: str, force: bool = False):
     await interaction.response.defer()
     
-    player_id = search_player_by_name(player_name)
+    player_id = await executors.run_io(search_player_by_name, player_name)
     if not player_id:
         await interaction.followup.send(f"Could not find player: {player_name}")
         return
         
-    player = get_player_by_id(player_id)
+    player = await executors.run_io(get_player_by_id, player_id)
     
-    # Update player's data
-    conn = sqlite3.connect('baseball.db')
+    refresh_scheduler.touch(player_id)
+    
+    # Update player's data unless it was refreshed recently
     try:
-        await interaction.followup.send(f"Fetching data for {player.playerName}...")
-        getData.getPlayerBattingPlateAppearances(player_id, conn)
-        getData.getPlayerPitchingPlateAppearances(player_id, conn)
-        conn.commit()
+        if force or not await executors.run_io(getData.is_player_fresh, player_id):
+            await interaction.followup.send(f"Fetching data for {player.playerName}...")
+            await executors.run_io(getData.refresh_player, player_id, None, force,
+                                   timeout=executors.REFRESH_TIMEOUT)
         
         # Verify we got data
-        c = conn.cursor()
-        c.execute('SELECT COUNT(*) FROM plate_appearances WHERE hitterID = ?', (player_id,))
-        count = c.fetchone()[0]
+        count = await executors.run_io(count_plate_appearances, player_id, 'hitterID')
         if count == 0:
             await interaction.followup.send(f"No batting data found for {player.playerName}")
             return
             
+    except asyncio.TimeoutError:
+        await interaction.followup.send(f"Timed out fetching data for {player.playerName}, try again shortly")
+        return
     except Exception as e:
         await interaction.followup.send(f"Error updating data: {str(e)}")
         return
-    finally:
-        conn.close()
     
     active_lookups[interaction.user.id] = {'type': 'batter', 'id': player_id}
     await interaction.followup.send(f"Set active batter to {player.playerName} with {count} plate appearances")
@@ -120,23 +164,7 @@ async def pitcher_dist(interaction: discord.Interaction):
         return
     
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
-    
-    plt.switch_backend('Agg')
-    fig = pitching_analysis.plot_distributions(player_id)
-    if fig is None:
-        await interaction.followup.send("Error generating plot")
-        return
-        
-    buffer = io.BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buffer.seek(0)
-    
-    await interaction.followup.send(
-        f"**Pitch Distributions for {player.playerName}**",
-        file=discord.File(buffer, 'distributions.png')
-    )
+    await send_chart(interaction, 'pitcher_distributions', player_id, 'Pitch Distributions', 'distributions.png')
 
 @bot.tree.command(name="pitchermatrices", description="Show pitcher's pattern matrices")
 async def pitcher_matrices(interaction: discord.Interaction):
@@ -146,23 +174,7 @@ async def pitcher_matrices(interaction: discord.Interaction):
         return
     
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
-    
-    plt.switch_backend('Agg')
-    fig = pitching_analysis.plot_matrices(player_id)
-    if fig is None:
-        await interaction.followup.send("Error generating plot")
-        return
-        
-    buffer = io.BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buffer.seek(0)
-    
-    await interaction.followup.send(
-        f"**Pattern Matrices for {player.playerName}**",
-        file=discord.File(buffer, 'matrices.png')
-    )
+    await send_chart(interaction, 'pitcher_matrices', player_id, 'Pattern Matrices', 'matrices.png')
 
 @bot.tree.command(name="pitcherfirst", description="Show pitcher's first pitch trends")
 async def pitcher_first(interaction: discord.Interaction):
@@ -173,23 +185,7 @@ async def pitcher_first(interaction: discord.Interaction):
     await interaction.response.defer()
     
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
-    
-    plt.switch_backend('Agg')
-    fig = pitching_analysis.plot_first_pitch_trends(player_id)
-    if fig is None:
-        await interaction.followup.send("Error generating plot")
-        return
-        
-    buffer = io.BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buffer.seek(0)
-    
-    await interaction.followup.send(
-        f"**First Pitch Analysis for {player.playerName}**",
-        file=discord.File(buffer, 'first_pitches.png')
-    )
+    await send_chart(interaction, 'pitcher_first_pitches', player_id, 'First Pitch Analysis', 'first_pitches.png')
 
 @bot.tree.command(name="batterdist", description="Show batter's distributions")
 async def batter_dist(interaction: discord.Interaction):
@@ -200,23 +196,7 @@ async def batter_dist(interaction: discord.Interaction):
     await interaction.response.defer()
     
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
-    
-    plt.switch_backend('Agg')
-    fig = batting_analysis.plot_distributions(player_id)
-    if fig is None:
-        await interaction.followup.send("Error generating plot")
-        return
-        
-    buffer = io.BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buffer.seek(0)
-    
-    await interaction.followup.send(
-        f"**Swing Distributions for {player.playerName}**",
-        file=discord.File(buffer, 'distributions.png')
-    )
+    await send_chart(interaction, 'batter_distributions', player_id, 'Swing Distributions', 'distributions.png')
 
 @bot.tree.command(name="battermatrices", description="Show batter's pattern matrices")
 async def batter_matrices(interaction: discord.Interaction):
@@ -227,23 +207,7 @@ async def batter_matrices(interaction: discord.Interaction):
     await interaction.response.defer()
     
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
-    
-    plt.switch_backend('Agg')
-    fig = batting_analysis.plot_matrices(player_id)
-    if fig is None:
-        await interaction.followup.send("Error generating plot")
-        return
-        
-    buffer = io.BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buffer.seek(0)
-    
-    await interaction.followup.send(
-        f"**Pattern Matrices for {player.playerName}**",
-        file=discord.File(buffer, 'matrices.png')
-    )
+    await send_chart(interaction, 'batter_matrices', player_id, 'Pattern Matrices', 'matrices.png')
 
 @bot.tree.command(name="battersequence", description="Show batter's game sequences")
 async def batter_sequence(interaction: discord.Interaction):
@@ -253,23 +217,7 @@ async def batter_sequence(interaction: discord.Interaction):
         return
     
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
-    
-    plt.switch_backend('Agg')
-    fig = batting_analysis.plot_game_sequences_overlay(player_id)
-    if fig is None:
-        await interaction.followup.send("Error generating plot")
-        return
-        
-    buffer = io.BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buffer.seek(0)
-    
-    await interaction.followup.send(
-        f"**Game Sequences for {player.playerName}**",
-        file=discord.File(buffer, 'sequences.png')
-    )
+    await send_chart(interaction, 'batter_sequences', player_id, 'Game Sequences', 'sequences.png')
 
 @bot.tree.command(name="pitchersequence", description="Show pitcher's game sequences")
 async def pitcher_sequence(interaction: discord.Interaction):
@@ -280,23 +228,7 @@ async def pitcher_sequence(interaction: discord.Interaction):
     await interaction.response.defer()
     
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
-    
-    plt.switch_backend('Agg')
-    fig = pitching_analysis.plot_game_sequences_overlay(player_id)
-    if fig is None:
-        await interaction.followup.send("Error generating plot")
-        return
-        
-    buffer = io.BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buffer.seek(0)
-    
-    await interaction.followup.send(
-        f"**Game Sequences for {player.playerName}**",
-        file=discord.File(buffer, 'sequences.png')
-    )
+    await send_chart(interaction, 'pitcher_sequences', player_id, 'Game Sequences', 'sequences.png')
 
 @bot.tree.command(name="guesspitch", description="Predict pitcher's next pitch")
 async def guess_pitch(interaction: discord.Interaction, prev_pitch: int = None, prev_diff: int = None):
@@ -304,15 +236,21 @@ async def guess_pitch(interaction: discord.Interaction, prev_pitch: int = None,
         await interaction.response.send_message("Please select a pitcher first using /pitcher")
         return
     
+    await interaction.response.defer()
+    
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
+    player = await executors.run_io(get_player_by_id, player_id)
     
-    prediction, confidence, sample_size = pitching_analysis.predict_next_pitch(
-        player_id, prev_pitch, prev_diff
-    )
+    try:
+        prediction, confidence, sample_size = await executors.run_cpu(
+            pitching_analysis.predict_next_pitch, player_id, prev_pitch, prev_diff
+        )
+    except asyncio.TimeoutError:
+        await interaction.followup.send("Timed out making a prediction, try again shortly")
+        return
     
     if prediction is None:
-        await interaction.response.send_message(
+        await interaction.followup.send(
             f"Not enough data to make a prediction for {player.playerName}"
         )
         return
@@ -346,7 +284,7 @@ async def guess_pitch(interaction: discord.Interaction, prev_pitch: int = None,
     
     message.append("\n*Prediction uses sliding window of 3 pitches and weights recent data more heavily*")
         
-    await interaction.response.send_message("\n".join(message))
+    await interaction.followup.send("\n".join(message))
 
 @bot.tree.command(name="guessswing", description="Predict batter's next swing")
 async def guess_swing(interaction: discord.Interaction, prev_swing: int = None, prev_diff: int = None):
@@ -354,15 +292,21 @@ async def guess_swing(interaction: discord.Interaction, prev_swing: int = None,
         await interaction.response.send_message("Please select a batter first using /batter")
         return
     
+    await interaction.response.defer()
+    
     player_id = active_lookups[interaction.user.id]['id']
-    player = get_player_by_id(player_id)
+    player = await executors.run_io(get_player_by_id, player_id)
     
-    prediction, confidence, sample_size = batting_analysis.predict_next_swing(
-        player_id, prev_swing, prev_diff
-    )
+    try:
+        prediction, confidence, sample_size = await executors.run_cpu(
+            batting_analysis.predict_next_swing, player_id, prev_swing, prev_diff
+        )
+    except asyncio.TimeoutError:
+        await interaction.followup.send("Timed out making a prediction, try again shortly")
+        return
     
     if prediction is None:
-        await interaction.response.send_message(
+        await interaction.followup.send(
             f"Not enough data to make a prediction for {player.playerName}"
         )
         return
@@ -396,7 +340,31 @@ async def guess_swing(interaction: discord.Interaction, prev_swing: int = None,
     
     message.append("\n*Prediction uses sliding window of 3 swings and combines player & team patterns*")
         
-    await interaction.response.send_message("\n".join(message))
+    await interaction.followup.send("\n".join(message))
+
+def count_plate_appearances(player_id, column):
+    """Stored PAs with player_id in column ('pitcherID' or 'hitterID')"""
+    with db.reader() as conn:
+        c = conn.cursor()
+        c.execute(f'SELECT COUNT(*) FROM plate_appearances WHERE {column} = ?', (player_id,))
+        return c.fetchone()[0]
+
+async def send_chart(interaction, kind, player_id, title, filename):
+    """Render one of charts.CHARTS on the chart service and post it as a follow-up"""
+    player = await executors.run_io(get_player_by_id, player_id)
+    try:
+        png = await chart_service.render(ChartSpec(kind, player_id))
+    except asyncio.TimeoutError:
+        await interaction.followup.send("Timed out generating plot, try again shortly")
+        return
+    if png is None:
+        await interaction.followup.send("Error generating plot")
+        return
+    
+    await interaction.followup.send(
+        f"**{title} for {player.playerName}**",
+        file=discord.File(io.BytesIO(png), filename)
+    )
 
 def check_active_pitcher(interaction):
     """Check if user has an active pitcher selected"""
@@ -414,9 +382,26 @@ def check_active_batter(interaction):
 @app_commands.checks.has_permissions(administrator=True)
 async def update(interaction: discord.Interaction):
     await interaction.response.defer()
-    getData.main()
+    try:
+        await executors.run_sync(partial(getData.sync, incremental=True, resume=True),
+                                 timeout=executors.UPDATE_TIMEOUT)
+    except asyncio.TimeoutError:
+        await interaction.followup.send("Update is still running in the background")
+        return
     await interaction.followup.send("Database updated!")
 
+@bot.tree.command(name="renderstats", description="Show chart rendering queue and timings")
+@app_commands.checks.has_permissions(administrator=True)
+async def render_stats(interaction: discord.Interaction):
+    metrics = chart_service.metrics()
+    await interaction.response.send_message("\n".join([
+        f"Queue depth: {metrics['queue_depth']} ({metrics['in_flight']} in flight)",
+        f"Rendered: {metrics['rendered']}, failed: {metrics['failed']}, timed out: {metrics['timeouts']}",
+        f"Render time: {metrics['render_avg'] * 1000:.0f} ms avg, {metrics['render_p95'] * 1000:.0f} ms p95",
+        f"Queue wait: {metrics['wait_avg'] * 1000:.0f} ms avg",
+        f"Cache: {metrics['cache_hits']} hits, {metrics['cache_misses']} misses",
+    ]))
+
 @bot.tree.command(name="sync", description="Force sync all slash commands")
 @app_commands.checks.has_permissions(administrator=True)
 async def sync_commands(interaction: discord.Interaction):
@@ -441,7 +426,11 @@ async def sync(ctx):
 def run_bot():
     with open('token.txt', 'r') as f:
         token = f.read().strip()
-    bot.run(token)
+    try:
+        bot.run(token)
+    finally:
+        chart_service.shutdown()
+        executors.shutdown()
 
 if __name__ == "__main__":
     run_bot() 
\ No newline at end of file
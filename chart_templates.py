@@ -0,0 +1,114 @@
+import io
+from collections import namedtuple
+import numpy as np
+import matplotlib.pyplot as plt
+
+DEFAULT_DPI = 100
+
+# One heatmap in a MatrixFigure
+MatrixPanel = namedtuple('MatrixPanel', 'title xlabel ylabel xticklabels yticklabels')
+
+# One bar chart in a BarFigure; buckets are the bar positions
+BarPanel = namedtuple('BarPanel', 'title xlabel ylabel buckets xticklabels width grid')
+
+class ChartFigure:
+    """A figure laid out once and redrawn with new data.
+
+    Subclasses build every artist up front with a fixed layout (no
+    tight_layout or bbox_inches='tight', which each cost an extra draw), and
+    update() only swaps data and text in place. Reusing one instance per chart
+    kind skips building figures, axes, ticks and colorbars on every render.
+    """
+    figsize = (10, 8)
+    margins = {}
+
+    def __init__(self, dpi=DEFAULT_DPI):
+        self.dpi = dpi
+        self.fig = plt.figure(figsize=self.figsize, dpi=dpi)
+        self.fig.subplots_adjust(**self.margins)
+        self.title = self.fig.suptitle('')
+
+    def to_png(self):
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, format='png', dpi=self.dpi)
+        return buffer.getvalue()
+
+    def close(self):
+        plt.close(self.fig)
+
+class MatrixFigure(ChartFigure):
+    """A grid of 10x10 heatmaps with a value printed in every cell and a colorbar each"""
+    figsize = (20, 16)
+    margins = dict(left=0.07, right=0.97, bottom=0.08, top=0.93, wspace=0.25, hspace=0.35)
+
+    def __init__(self, panels, nrows=2, ncols=2, dpi=DEFAULT_DPI):
+        super().__init__(dpi)
+        self.images = []
+        self.cells = []
+        for index, panel in enumerate(panels):
+            ax = self.fig.add_subplot(nrows, ncols, index + 1)
+            image = ax.imshow(np.zeros((10, 10)), cmap='YlOrRd')
+            ax.set_title(panel.title)
+            ax.set_xlabel(panel.xlabel)
+            ax.set_ylabel(panel.ylabel)
+            ax.set_xticks(range(10))
+            ax.set_yticks(range(10))
+            ax.set_xticklabels(panel.xticklabels, rotation=45, ha='right')
+            ax.set_yticklabels(panel.yticklabels)
+            self.fig.colorbar(image, ax=ax, label='Percentage')
+            self.images.append(image)
+            self.cells.append([[ax.text(j, i, '', ha='center', va='center') for j in range(10)]
+                               for i in range(10)])
+
+    def update(self, title, matrices):
+        self.title.set_text(title)
+        for image, cells, matrix in zip(self.images, self.cells, matrices):
+            image.set_data(matrix)
+            # Same per-panel colour scaling imshow picks for a fresh plot
+            image.set_clim(matrix.min(), matrix.max())
+            for i in range(10):
+                for j in range(10):
+                    cells[i][j].set_text(f'{matrix[i, j]:.0f}')
+        return self
+
+class BarFigure(ChartFigure):
+    """Bar charts stacked vertically, one per BarPanel"""
+    figsize = (15, 12)
+    margins = dict(left=0.06, right=0.98, bottom=0.09, top=0.93, hspace=0.45)
+
+    def __init__(self, panels, dpi=DEFAULT_DPI):
+        super().__init__(dpi)
+        self.panels = panels
+        self.axes = []
+        self.bars = []
+        for index, panel in enumerate(panels):
+            ax = self.fig.add_subplot(len(panels), 1, index + 1)
+            bars = ax.bar(panel.buckets, np.zeros(len(panel.buckets)), width=panel.width)
+            ax.set_title(panel.title)
+            ax.set_xlabel(panel.xlabel)
+            ax.set_ylabel(panel.ylabel)
+            ax.set_xticks(panel.buckets)
+            ax.set_xticklabels(panel.xticklabels, rotation=45)
+            if panel.grid:
+                ax.grid(True, alpha=0.3)
+            self.axes.append(ax)
+            self.bars.append(bars)
+
+    def update(self, title, distributions):
+        """distributions: one {bucket: percentage} dict per panel; missing buckets draw as 0"""
+        self.title.set_text(title)
+        for panel, ax, bars, dist in zip(self.panels, self.axes, self.bars, distributions):
+            heights = [dist.get(bucket, 0) for bucket in panel.buckets]
+            for bar, height in zip(bars, heights):
+                bar.set_height(height)
+            ax.set_ylim(0, max(heights) * 1.05 or 1)
+        return self
+
+_templates = {}
+
+def get_template(key, factory):
+    """The figure cached under key in this process, built by factory() on first use"""
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = factory()
+    return template
@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import batting_analysis
+import pitching_analysis
+from chart_templates import BarFigure, MatrixFigure, DEFAULT_DPI, get_template
+import executors
+from executors import CPU_WORKERS, CPU_TIMEOUT
+from getData import player_data_version
+
+# Chart kinds the bot can ask a worker process to draw
+CHARTS = {
+    'pitcher_distributions': pitching_analysis.plot_distributions,
+    'pitcher_matrices': pitching_analysis.plot_matrices,
+    'pitcher_first_pitches': pitching_analysis.plot_first_pitch_trends,
+    'pitcher_sequences': pitching_analysis.plot_game_sequences_overlay,
+    'batter_distributions': batting_analysis.plot_distributions,
+    'batter_matrices': batting_analysis.plot_matrices,
+    'batter_sequences': batting_analysis.plot_game_sequences_overlay,
+}
+
+# Kinds drawn into a figure built once per worker process and updated in place
+TEMPLATES = {
+    'pitcher_distributions': lambda dpi: BarFigure(pitching_analysis.DISTRIBUTION_PANELS, dpi),
+    'pitcher_matrices': lambda dpi: MatrixFigure(pitching_analysis.MATRIX_PANELS, dpi=dpi),
+    'batter_distributions': lambda dpi: BarFigure(batting_analysis.DISTRIBUTION_PANELS, dpi),
+    'batter_matrices': lambda dpi: MatrixFigure(batting_analysis.MATRIX_PANELS, dpi=dpi),
+}
+
+RENDER_WORKERS = CPU_WORKERS
+RENDER_TIMEOUT = CPU_TIMEOUT
+TIMING_WINDOW = 200  # recent renders kept for the timing metrics
+CACHE_MAX_BYTES = 64 * 1024 * 1024  # in-memory PNGs
+CACHE_MAX_DISK_BYTES = 512 * 1024 * 1024
+# Part of every cache key. Bump it whenever a change alters how charts look, so
+# PNGs cached on disk by the previous code are not served after a deploy
+RENDER_VERSION = 2
+
+class ChartSpec(namedtuple('ChartSpec', 'kind player_id options')):
+    """What to draw: a CHARTS kind, a player, and keyword options for the plot function.
+
+    A 'dpi' option sets the output resolution instead of being passed on.
+    Options are stored as sorted (name, value) pairs so equal specs compare
+    and hash equal.
+    """
+    __slots__ = ()
+
+    def __new__(cls, kind, player_id, options=None):
+        return super().__new__(cls, kind, player_id, tuple(sorted(dict(options or ()).items())))
+
+class ChartCache:
+    """Rendered PNGs keyed by (ChartSpec, player data version) and RENDER_VERSION.
+
+    An in-memory LRU bounded by total size, optionally backed by a directory so
+    charts survive restarts. New PAs for a player change their data version, so
+    stale charts are simply never looked up again; storing a newer version of a
+    spec drops the older one from memory straight away.
+    """
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, cache_dir=None, max_disk_bytes=CACHE_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.versions = {}  # spec -> version currently held in memory
+        self.size = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, spec, version):
+        key = hashlib.sha256(repr((RENDER_VERSION, spec, version)).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}.png')
+
+    def get(self, spec, version):
+        with self.lock:
+            png = self.entries.get((spec, version))
+            if png is not None:
+                self.entries.move_to_end((spec, version))
+                return png
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(spec, version), 'rb') as f:
+                png = f.read()
+        except OSError:
+            return None
+        self._remember(spec, version, png)
+        return png
+
+    def put(self, spec, version, png):
+        self._remember(spec, version, png)
+        if self.cache_dir:
+            path = self._path(spec, version)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(png)
+            os.replace(tmp, path)
+            self._prune_disk()
+
+    def _remember(self, spec, version, png):
+        with self.lock:
+            old = self.versions.get(spec)
+            if old is not None and old != version:
+                self.size -= len(self.entries.pop((spec, old), b''))
+            if (spec, version) not in self.entries:
+                self.size += len(png)
+            self.entries[(spec, version)] = png
+            self.versions[spec] = version
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                (old_spec, _), evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.versions.pop(old_spec, None)
+
+    def _prune_disk(self):
+        # Oldest files go first once the directory outgrows its budget
+        files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.png')]
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.max_disk_bytes:
+                break
+            total -= entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def render_png(spec):
+    """Draw a ChartSpec and return it as PNG bytes, or None if there is nothing to draw"""
+    options = dict(spec.options)
+    dpi = options.pop('dpi', DEFAULT_DPI)
+    if spec.kind in TEMPLATES:
+        template = get_template((spec.kind, dpi), lambda: TEMPLATES[spec.kind](dpi))
+        if CHARTS[spec.kind](spec.player_id, figure=template, **options) is None:
+            return None
+        return template.to_png()
+    
+    # The other kinds lay themselves out with tight_layout, so no tight bbox pass
+    fig = CHARTS[spec.kind](spec.player_id, **options)
+    if fig is None:
+        return None
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+def _timed_render(spec):
+    started = time.perf_counter()
+    png = render_png(spec)
+    return png, time.perf_counter() - started
+
+def _init_worker():
+    # Importing this module in the worker already loaded matplotlib and the
+    # analysis modules; drawing once more builds the font cache and Agg state
+    # so the first real chart doesn't pay for it
+    fig = plt.figure(figsize=(1, 1))
+    fig.text(0.5, 0.5, '0')
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close(fig)
+
+def _ready():
+    return True
+
+class ChartService:
+    """Renders ChartSpecs to PNG bytes on a pool of worker processes.
+
+    Workers are spawned with matplotlib imported and warmed up, so charts for
+    different users render in parallel on separate cores while the bot's event
+    loop only waits. Results go through a ChartCache, so a chart whose data
+    hasn't changed is served without rendering. metrics() reports the queue
+    depth, cache hits and recent render times.
+    """
+    def __init__(self, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT, cache=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.cache = cache if cache is not None else ChartCache()
+        self.hits = 0
+        self.misses = 0
+        self.pool = None
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.rendered = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.render_times = deque(maxlen=TIMING_WINDOW)
+        self.wait_times = deque(maxlen=TIMING_WINDOW)
+
+    def start(self):
+        """Spawn and warm every worker now rather than on the first request"""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker)
+            for _ in range(self.workers):
+                self.pool.submit(_ready)
+        return self
+
+    async def render(self, spec, timeout=None):
+        """PNG bytes for spec, or None if the chart has no data. Raises asyncio.TimeoutError"""
+        version = await executors.run_io(player_data_version, spec.player_id)
+        png = await executors.run_io(self.cache.get, spec, version)
+        with self.lock:
+            if png is not None:
+                self.hits += 1
+                return png
+            self.misses += 1
+        
+        self.start()
+        with self.lock:
+            self.submitted += 1
+        started = time.perf_counter()
+        future = self.pool.submit(_timed_render, spec)
+        future.add_done_callback(self._render_finished)
+        try:
+            png, render_time = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self.lock:
+                self.timeouts += 1
+            raise
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        with self.lock:
+            self.rendered += 1
+            self.render_times.append(render_time)
+            self.wait_times.append(time.perf_counter() - started - render_time)
+        if png is not None:
+            await executors.run_io(self.cache.put, spec, version, png)
+        return png
+
+    def _render_finished(self, future):
+        # A timed-out render keeps its worker busy until it really ends (or is
+        # cancelled before starting), so only then does it stop counting as in flight
+        with self.lock:
+            self.completed += 1
+
+    def metrics(self):
+        """Queue depth, counts and recent render/wait times in seconds"""
+        with self.lock:
+            in_flight = self.submitted - self.completed
+            render_times = sorted(self.render_times)
+            wait_times = list(self.wait_times)
+            return {
+                'queue_depth': max(0, in_flight - self.workers),
+                'in_flight': in_flight,
+                'rendered': self.rendered,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'render_avg': sum(render_times) / len(render_times) if render_times else 0.0,
+                'render_p95': render_times[int(len(render_times) * 0.95)] if render_times else 0.0,
+                'wait_avg': sum(wait_times) / len(wait_times) if wait_times else 0.0,
+            }
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
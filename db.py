@@ -0,0 +1,107 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = 'baseball.db'
+READER_POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+
+# Applied to every connection. WAL lets readers keep using their snapshot while a
+# sync writes, and NORMAL sync is durable in WAL mode short of power loss.
+PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -32000',      # KiB, i.e. ~32 MB of page cache per connection
+    'PRAGMA mmap_size = 268435456',    # map up to 256 MB of the file
+    'PRAGMA temp_store = MEMORY',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+]
+
+def connect(path=DB_PATH, readonly=False):
+    """Open a tuned connection. Pooled connections are shared across threads,
+    one user at a time, so same-thread checking is off"""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+class ConnectionPool:
+    """A small pool of read-only connections plus a single writer for one database file"""
+    def __init__(self, path, reader_pool_size=READER_POOL_SIZE):
+        self.path = path
+        self.readers = queue.LifoQueue(maxsize=reader_pool_size)
+        self.writer_lock = threading.RLock()
+        self.writer_conn = None
+
+    @contextmanager
+    def reader(self):
+        try:
+            conn = self.readers.get_nowait()
+        except queue.Empty:
+            conn = connect(self.path, readonly=True)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self.readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def writer(self):
+        """The one writer connection, held exclusively for the duration of the block"""
+        with self.writer_lock:
+            if self.writer_conn is None:
+                self.writer_conn = connect(self.path)
+            try:
+                yield self.writer_conn
+            except Exception:
+                if self.writer_conn.in_transaction:
+                    self.writer_conn.rollback()
+                raise
+            else:
+                if self.writer_conn.in_transaction:
+                    self.writer_conn.commit()
+
+    def close(self):
+        with self.writer_lock:
+            if self.writer_conn is not None:
+                self.writer_conn.close()
+                self.writer_conn = None
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(path=None):
+    """Pool for path (default DB_PATH), keyed by absolute path so a chdir can't mix files up"""
+    path = os.path.abspath(path or DB_PATH)
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path)
+        return _pools[path]
+
+def reader(path=None):
+    """Context manager yielding a pooled read-only connection"""
+    return get_pool(path).reader()
+
+def writer(path=None):
+    """Context manager yielding the single writer connection; commits on success"""
+    return get_pool(path).writer()
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
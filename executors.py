@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+IO_WORKERS = 8
+CPU_WORKERS = min(4, os.cpu_count() or 1)
+IO_TIMEOUT = 30        # seconds for a lookup
+REFRESH_TIMEOUT = 180  # seconds for downloading and storing one player
+CPU_TIMEOUT = 60       # seconds for an analysis or a chart
+SYNC_TIMEOUT = 4 * 3600
+REFRESH_ROUND_TIMEOUT = 5 * 60  # seconds for one round of background player refreshes
+UPDATE_TIMEOUT = 10 * 60  # how long /update waits before reporting the sync as still running
+
+# Blocking I/O (HTTP, SQLite) runs on threads; analysis and rendering run in
+# worker processes so they neither hold the GIL nor stall the event loop. Full
+# syncs get a thread of their own, so a long sync never ties up the I/O pool
+# and a second sync queues behind the first instead of racing it. Background
+# refresh rounds get another, so neither kind waits behind the other.
+_io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='io')
+_sync_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sync')
+_refresh_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='refresh')
+_cpu_pool = None
+_syncs_pending = 0  # submitted to _sync_pool and not yet finished
+_syncs_lock = threading.Lock()
+
+def get_cpu_pool():
+    """The worker process pool, started on first use.
+
+    Workers are spawned rather than forked: a forked child would inherit the
+    parent's open SQLite connections and any locks held at the time.
+    """
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+    return _cpu_pool
+
+async def _run(pool, timeout, fn, *args):
+    # A timeout only stops the wait; the call itself runs to completion in the
+    # pool, where it can still finish writing what it started
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(pool, fn, *args), timeout)
+
+async def run_io(fn, *args, timeout=IO_TIMEOUT):
+    """Run blocking I/O on the thread pool. Raises asyncio.TimeoutError after timeout seconds"""
+    return await _run(_io_pool, timeout, fn, *args)
+
+async def run_cpu(fn, *args, timeout=CPU_TIMEOUT):
+    """Run fn in a worker process; fn and its arguments must be picklable"""
+    return await _run(get_cpu_pool(), timeout, fn, *args)
+
+async def run_sync(fn, *args, timeout=SYNC_TIMEOUT):
+    """Run a long database sync on its dedicated thread"""
+    global _syncs_pending
+    with _syncs_lock:
+        _syncs_pending += 1
+    # Submitted directly so the count drops when the sync really ends (or is
+    # cancelled while still queued), not when a caller stops waiting for it
+    future = _sync_pool.submit(fn, *args)
+    future.add_done_callback(_sync_finished)
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+def _sync_finished(future):
+    global _syncs_pending
+    with _syncs_lock:
+        _syncs_pending -= 1
+
+def sync_running():
+    """Whether a full sync is running or queued"""
+    return _syncs_pending > 0
+
+async def run_refresh(fn, *args, timeout=REFRESH_ROUND_TIMEOUT):
+    """Run a round of background player refreshes on its dedicated thread"""
+    return await _run(_refresh_pool, timeout, fn, *args)
+
+def shutdown():
+    global _cpu_pool
+    _io_pool.shutdown(wait=False, cancel_futures=True)
+    _sync_pool.shutdown(wait=False, cancel_futures=True)
+    _refresh_pool.shutdown(wait=False, cancel_futures=True)
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
@@ -0,0 +1,308 @@
+import codecs
+import gzip
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from http_cache import ResponseCache, CACHE_DIR, DEFAULT_TTL
+
+API_BASE = 'https://www.rslashfakebaseball.com'
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 10
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF = 0.5  # seconds before the first retry, doubled each attempt
+MAX_RETRY_AFTER = 60  # longest server-requested wait honoured before a retry, in seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024
+
+class FetchError(Exception):
+    """Raised when a request still fails after every retry"""
+
+class RateLimiter:
+    """Spaces out requests so no single host sees more than the configured rate"""
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, url):
+        """Block until the host behind url may be hit again"""
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; anyone asking for that key
+    while it is in flight waits for and shares its result (or exception)
+    instead of repeating the work.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+class Body:
+    """A downloaded response body kept on disk and read back in chunks"""
+    def __init__(self, path, compressed, temporary=False):
+        self.path = path
+        self.compressed = compressed
+        self.temporary = temporary
+
+    def chunks(self, size=CHUNK_SIZE):
+        opener = gzip.open if self.compressed else open
+        with opener(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def read(self):
+        return b''.join(self.chunks())
+
+    def close(self):
+        if self.temporary:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+def iter_json_array(chunks):
+    """Yield the elements of a JSON array of objects as the bytes arrive.
+
+    Only one element (plus the unread tail of the current chunk) is held at a
+    time. A body that isn't an array is decoded whole: a top-level object is
+    treated as having no elements.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    exhausted = False
+
+    def fill():
+        nonlocal buf, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buf = buf[pos:] + utf8.decode(b'', final=True)
+        else:
+            buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or exhausted:
+                return
+            fill()
+
+    skip(' \t\r\n')
+    if pos >= len(buf):
+        return
+    if buf[pos] != '[':
+        while not exhausted:
+            fill()
+        value = json.loads(buf)
+        if isinstance(value, list):
+            yield from value
+        return
+    pos += 1
+    while True:
+        skip(' \t\r\n,')
+        if pos >= len(buf):
+            raise ValueError('Unterminated JSON array')
+        if buf[pos] == ']':
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                break
+            except ValueError:
+                if exhausted:
+                    raise
+                fill()
+        pos = end
+        yield value
+
+class EndpointStats:
+    """Per-endpoint request, retry and failure counts"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(lambda: defaultdict(int))
+
+    @staticmethod
+    def endpoint(path):
+        # Collapse player IDs so /api/plateappearances/batting/mlr/123 and /456 share a bucket
+        return re.sub(r'/\d+', '/{id}', path.split('?')[0])
+
+    def record(self, path, outcome):
+        with self.lock:
+            self.counts[self.endpoint(path)][outcome] += 1
+
+    def summary(self):
+        """Returns {endpoint: {outcome: count}} as plain dicts"""
+        with self.lock:
+            return {endpoint: dict(counts) for endpoint, counts in self.counts.items()}
+
+    def print_summary(self):
+        for endpoint, counts in sorted(self.summary().items()):
+            line = ', '.join(f'{outcome}: {count}' for outcome, count in sorted(counts.items()))
+            print(f"{endpoint} - {line}")
+
+class Fetcher:
+    """Bounded worker pool for API requests against a single base URL.
+
+    Requests share one keep-alive session sized to the worker pool, time out
+    instead of hanging, and retry connection errors, 429s and 5xx responses with
+    exponential backoff plus jitter. Responses go through an on-disk
+    ResponseCache unless cache_dir is None.
+    """
+    def __init__(self, base_url=API_BASE, max_workers=DEFAULT_MAX_WORKERS,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                 cache_dir=CACHE_DIR, cache_ttl=DEFAULT_TTL,
+                 timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff=DEFAULT_BACKOFF):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max(1, max_workers)
+        self.limiter = RateLimiter(requests_per_second)
+        self.cache = ResponseCache(cache_dir, cache_ttl) if cache_dir else None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats = EndpointStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def url(self, path):
+        return f'{self.base_url}{path}'
+
+    def get_json(self, path):
+        """Returns the decoded JSON body for path, or None if the server has no such resource"""
+        body = self.get_body(path)
+        if body is None:
+            return None
+        return json.loads(body)
+
+    def get_body(self, path):
+        """Returns the raw response body for path, serving or revalidating cached copies"""
+        body = self.fetch(path)
+        if body is None:
+            return None
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def fetch(self, path, revalidate=False):
+        """Download path to disk without holding it in memory, returning a Body or None.
+
+        Responses are streamed straight into the cache; uncacheable ones are
+        spooled to a temporary file that Body.close() removes. With revalidate
+        a cached copy is never served without asking the server first, however
+        fresh it is.
+        """
+        url = self.url(path)
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry is not None and not revalidate and self.cache.is_fresh(entry):
+            return Body(self.cache.body_path(url), compressed=True)
+        
+        headers = self.cache.conditional_headers(entry) if self.cache else {}
+        with self.request(path, headers, stream=True) as response:
+            if response.status_code == 304 and entry is not None:
+                self.cache.revalidated(url, entry, response.headers)
+                return Body(self.cache.body_path(url), compressed=True)
+            if response.status_code != 200:
+                print(f"Request for {path} returned {response.status_code}")
+                return None
+            chunks = response.iter_content(CHUNK_SIZE)
+            if self.cache and self.cache.cacheable(response.headers):
+                return Body(self.cache.store_stream(url, chunks, response.headers), compressed=True)
+            fd, spool = tempfile.mkstemp(suffix='.json')
+            body = Body(spool, compressed=False, temporary=True)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+            except BaseException:
+                body.close()
+                raise
+            return body
+
+    def request(self, path, headers=None, stream=False):
+        """GET path, retrying transient failures. Raises FetchError once retries run out"""
+        url = self.url(path)
+        response = error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats.record(path, 'retries')
+                time.sleep(self._retry_delay(attempt, response))
+            self.limiter.wait(url)
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                self.stats.record(path, 'ok' if response.status_code in (200, 304) else str(response.status_code))
+                return response
+            response.close()
+        self.stats.record(path, 'failures')
+        reason = str(error) if error is not None else f'status {response.status_code}'
+        raise FetchError(f"{path} failed after {self.max_retries + 1} attempts ({reason})")
+
+    def _retry_delay(self, attempt, response):
+        """Full-jitter exponential backoff, deferring to Retry-After (up to MAX_RETRY_AFTER) when sent"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(int(retry_after), MAX_RETRY_AFTER)
+        return random.uniform(0, self.backoff * (2 ** (attempt - 1)))
@@ -0,0 +1,302 @@
+"""Record/replay fixtures for the rslashfakebaseball API.
+
+A fixture directory mirrors the API's URL layout, one JSON file per response:
+
+    <dir>/api/players.json
+    <dir>/api/plateappearances/batting/mlr/<playerID>.json
+    <dir>/api/plateappearances/pitching/mlr/<playerID>.json
+
+    python fixtures.py record DIR [--limit N]        capture live responses
+    python fixtures.py generate DIR --players 300    build a synthetic league
+    python fixtures.py scale SRC DST --factor 10     clone a league N times over
+    python fixtures.py serve DIR --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from fetcher import Fetcher, API_BASE, DEFAULT_MAX_WORKERS, iter_json_array
+
+ROLES = ('batting', 'pitching')
+
+def fixture_path(fixture_dir, path):
+    """File holding the response for an API path"""
+    return os.path.join(fixture_dir, *path.strip('/').split('/')) + '.json'
+
+def feed_path(fixture_dir, pa_type, player_id):
+    return fixture_path(fixture_dir, f'/api/plateappearances/{pa_type}/mlr/{player_id}')
+
+def _write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(value, f)
+
+def _read_feed(path):
+    with open(path, 'rb') as f:
+        yield from iter_json_array(iter(lambda: f.read(64 * 1024), b''))
+
+def record(fixture_dir, base_url=API_BASE, limit=None, max_workers=DEFAULT_MAX_WORKERS):
+    """Capture /api/players and every player's feeds from base_url into fixture_dir"""
+    fetcher = Fetcher(base_url, max_workers=max_workers, cache_dir=None)
+    players = fetcher.get_json('/api/players')
+    if players is None:
+        raise RuntimeError(f"Could not download the player list from {base_url}")
+    if limit:
+        players = players[:limit]
+    _write_json(fixture_path(fixture_dir, '/api/players'), players)
+
+    def fetch_player(player_id):
+        try:
+            for pa_type in ROLES:
+                path = f'/api/plateappearances/{pa_type}/mlr/{player_id}'
+                body = fetcher.get_body(path)
+                target = fixture_path(fixture_dir, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(body if body is not None else b'[]')
+        except Exception as e:
+            print(f"Error fetching {player_id}: {str(e)}")
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=fetcher.max_workers) as pool:
+        recorded = sum(pool.map(fetch_player, [p['playerID'] for p in players]))
+    print(f"Recorded {recorded} of {len(players)} players to {fixture_dir}")
+    fetcher.close()
+
+def generate_league(fixture_dir, players=300, games=400, pas_per_game=40, seed=0):
+    """Write a synthetic but internally consistent league.
+
+    Every PA is served from both its hitter's batting feed and its pitcher's
+    pitching feed, as on the live API. Pitches, swings and diffs are random
+    in their real ranges.
+    """
+    rng = random.Random(seed)
+    teams = [f'T{i:02d}' for i in range(max(2, players // 20))]
+    roster = []
+    for player_id in range(1, players + 1):
+        is_pitcher = player_id % 3 == 0
+        roster.append({
+            'playerID': player_id, 'playerName': f'Player {player_id}',
+            'Team': teams[player_id % len(teams)], 'batType': 'N', 'hand': rng.choice('LR'),
+            'pitchType': 'N' if is_pitcher else None, 'pitchBonus': 'N' if is_pitcher else None,
+            'priPos': 'P' if is_pitcher else rng.choice(['C', '1B', '2B', 'SS', '3B', 'LF', 'CF', 'RF']),
+            'secPos': None, 'tertPos': None, 'redditName': f'u/player{player_id}',
+            'discordName': f'player{player_id}', 'discordID': str(10 ** 17 + player_id),
+            'status': 1, 'posValue': 0,
+        })
+    by_team = {team: [p for p in roster if p['Team'] == team] for team in teams}
+    feeds = {(pa_type, p['playerID']): [] for p in roster for pa_type in ROLES}
+
+    pa_id = 0
+    for game in range(games):
+        season, session = 1 + game // 200, 1 + (game // 10) % 20
+        home, away = rng.sample(teams, 2)
+        for number in range(pas_per_game):
+            batting_team, fielding_team = (away, home) if number % 2 == 0 else (home, away)
+            hitters = by_team[batting_team]
+            pitchers = [p for p in by_team[fielding_team] if p['pitchType']] or by_team[fielding_team]
+            hitter = hitters[(number // 2) % len(hitters)]
+            pitcher = pitchers[game % len(pitchers)]
+            pitch, swing = rng.randint(1, 1000), rng.randint(1, 1000)
+            diff = abs(pitch - swing)
+            diff = min(diff, 1000 - diff)
+            pa_id += 1
+            pa = {
+                'paID': pa_id, 'league': 'mlr', 'season': season, 'session': session,
+                'gameID': f'{season}.{game}', 'inning': f'{"T" if number % 2 == 0 else "B"}{1 + number // 6}',
+                'inningID': number // 3, 'playNumber': number, 'outs': number % 3, 'obc': 0,
+                'awayScore': 0, 'homeScore': 0,
+                'pitcherTeam': fielding_team, 'pitcherName': pitcher['playerName'], 'pitcherID': pitcher['playerID'],
+                'hitterTeam': batting_team, 'hitterName': hitter['playerName'], 'hitterID': hitter['playerID'],
+                'pitch': pitch, 'swing': swing, 'diff': diff,
+                'exactResult': 'K' if diff > 300 else '1B', 'oldResult': 'K' if diff > 300 else '1B',
+                'resultAtNeutral': 'K', 'resultAllNeutral': 'K', 'rbi': 0, 'run': 0,
+                'batterWPA': 0.0, 'pitcherWPA': 0.0, 'pr3B': None, 'pr2B': None, 'pr1B': None, 'prAB': None,
+            }
+            feeds[('batting', hitter['playerID'])].append(pa)
+            feeds[('pitching', pitcher['playerID'])].append(pa)
+
+    _write_json(fixture_path(fixture_dir, '/api/players'), roster)
+    for (pa_type, player_id), pas in feeds.items():
+        _write_json(feed_path(fixture_dir, pa_type, player_id), pas)
+    print(f"Generated {players} players and {pa_id} PAs in {fixture_dir}")
+
+def scale_league(source_dir, fixture_dir, factor):
+    """Write factor copies of a fixture league side by side with remapped IDs.
+
+    Feeds are rewritten one file at a time, so a 100x league never has to fit
+    in memory.
+    """
+    with open(fixture_path(source_dir, '/api/players')) as f:
+        players = json.load(f)
+    max_paID = 0
+    for player in players:
+        for pa_type in ROLES:
+            path = feed_path(source_dir, pa_type, player['playerID'])
+            if os.path.exists(path):
+                max_paID = max([max_paID] + [pa['paID'] for pa in _read_feed(path)])
+    player_stride = 10 ** len(str(max(p['playerID'] for p in players)))
+    pa_stride = 10 ** len(str(max_paID))
+
+    def remap(pa, copy):
+        pa = dict(pa, paID=pa['paID'] + copy * pa_stride, gameID=f"{pa['gameID']}-{copy}")
+        for key in ('hitterID', 'pitcherID'):
+            if pa.get(key) is not None:
+                pa[key] += copy * player_stride
+        return pa
+
+    scaled = []
+    for copy in range(factor):
+        for player in players:
+            new_id = player['playerID'] + copy * player_stride
+            scaled.append(dict(player, playerID=new_id,
+                               playerName=player['playerName'] if copy == 0 else f"{player['playerName']} #{copy}"))
+            for pa_type in ROLES:
+                path = feed_path(source_dir, pa_type, player['playerID'])
+                pas = [remap(pa, copy) for pa in _read_feed(path)] if os.path.exists(path) else []
+                _write_json(feed_path(fixture_dir, pa_type, new_id), pas)
+    _write_json(fixture_path(fixture_dir, '/api/players'), scaled)
+    print(f"Scaled {len(players)} players x{factor} into {fixture_dir}")
+
+class ReplayServer:
+    """Serves a fixture directory over HTTP on a background thread.
+
+    latency (plus up to jitter) seconds are slept before each response and
+    error_rate of requests fail with a 503, to exercise retries. Responses carry
+    an ETag so conditional requests get 304s like the live site would give.
+    Use as a context manager; base_url points at the running server.
+    """
+    def __init__(self, fixture_dir, latency=0.0, jitter=0.0, error_rate=0.0, port=0, seed=None):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'not_modified': 0, 'errors': 0, 'bytes': 0}
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def _handler(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                replay._count('requests')
+                with replay.rng_lock:
+                    delay = replay.latency + replay.rng.uniform(0, replay.jitter)
+                    fail = replay.rng.random() < replay.error_rate
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    replay._count('errors')
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                path = fixture_path(replay.fixture_dir, self.path.split('?')[0])
+                if not os.path.isfile(path):
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                with open(path, 'rb') as f:
+                    body = f.read()
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    replay._count('not_modified')
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                replay._count('bytes', len(body))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description='Record, generate and replay API fixtures')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rec = subparsers.add_parser('record', help='Capture live API responses')
+    rec.add_argument('fixture_dir')
+    rec.add_argument('--base-url', default=API_BASE)
+    rec.add_argument('--limit', type=int, help='Only record the first N players')
+
+    gen = subparsers.add_parser('generate', help='Write a synthetic league')
+    gen.add_argument('fixture_dir')
+    gen.add_argument('--players', type=int, default=300)
+    gen.add_argument('--games', type=int, default=400)
+    gen.add_argument('--seed', type=int, default=0)
+
+    scale = subparsers.add_parser('scale', help='Clone a fixture league N times')
+    scale.add_argument('source_dir')
+    scale.add_argument('fixture_dir')
+    scale.add_argument('--factor', type=int, default=10)
+
+    serve = subparsers.add_parser('serve', help='Serve a fixture directory')
+    serve.add_argument('fixture_dir')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    serve.add_argument('--jitter', type=float, default=0.0, help='Extra random latency, up to this many seconds')
+    serve.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        record(args.fixture_dir, args.base_url, args.limit)
+    elif args.command == 'generate':
+        generate_league(args.fixture_dir, args.players, args.games, seed=args.seed)
+    elif args.command == 'scale':
+        scale_league(args.source_dir, args.fixture_dir, args.factor)
+    else:
+        server = ReplayServer(args.fixture_dir, args.latency, args.jitter, args.error_rate, args.port)
+        print(f"Serving {args.fixture_dir} at {server.base_url}")
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,42 @@
-from models import Player, PlateAppearance
-import requests
-import sqlite3
+from models import Player, PlateAppearance, PLAYER_FIELDS, PA_FIELDS
+from fetcher import Fetcher, SingleFlight, iter_json_array, API_BASE, DEFAULT_MAX_WORKERS, DEFAULT_REQUESTS_PER_SECOND
+from http_cache import CACHE_DIR, DEFAULT_TTL
+import argparse
 import os
+import socket
+import db
+import queue
+import threading
+import time
+from itertools import islice
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+def get_fetcher():
+    """Shared Fetcher so every call in this module reuses the same connection pool"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher()
+        return _fetcher
+
+def configure_fetcher(*args, **kwargs):
+    """Replace the shared Fetcher, taking the same arguments as Fetcher()"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is not None:
+            _fetcher.close()
+        _fetcher = Fetcher(*args, **kwargs)
+        return _fetcher
 
 def init_db():
     # Create database if it doesn't exist
-    conn = sqlite3.connect('baseball.db')
+    with db.writer() as conn:
+        _create_tables(conn)
+        migrate(conn)
+
+def _create_tables(conn):
     c = conn.cursor()
     
     # Create tables
@@ -68,8 +99,98 @@ def init_db():
         )
     ''')
     
+    # Which feeds (batting/pitching) each stored PA has been seen in
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS pa_feeds (
+            paID INTEGER,
+            pa_type TEXT,
+            PRIMARY KEY (paID, pa_type)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Highest PA already stored for each player's batting and pitching feed
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            playerID INTEGER,
+            pa_type TEXT,
+            last_paID INTEGER,
+            season INTEGER,
+            session INTEGER,
+            last_synced TEXT,
+            PRIMARY KEY (playerID, pa_type)
+        )
+    ''')
+    
     conn.commit()
-    conn.close()
+
+# Schema upgrades applied in order on top of the tables created above. Applying
+# entry N sets PRAGMA user_version to N, so existing databases pick up only the
+# steps they are missing. Append new steps; never edit one that has shipped.
+MIGRATIONS = [
+    # 1: per-player lookups ordered by season/session, and game grouping
+    [
+        'CREATE INDEX IF NOT EXISTS idx_pa_hitter ON plate_appearances (hitterID, season, session, paID)',
+        'CREATE INDEX IF NOT EXISTS idx_pa_pitcher ON plate_appearances (pitcherID, season, session, paID)',
+        'CREATE INDEX IF NOT EXISTS idx_pa_game ON plate_appearances (gameID)',
+    ],
+    # 2: sync checkpoints, so an interrupted or partly failed sync can be resumed
+    [
+        '''CREATE TABLE IF NOT EXISTS sync_runs (
+            runID INTEGER PRIMARY KEY,
+            incremental INTEGER,
+            started TEXT,
+            finished TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS sync_progress (
+            playerID INTEGER,
+            pa_type TEXT,
+            runID INTEGER,
+            status TEXT,
+            error TEXT,
+            updated TEXT,
+            PRIMARY KEY (playerID, pa_type)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_sync_progress_status ON sync_progress (status)',
+    ],
+    # 3: covering indexes for search_player.query_plate_appearances, so analysis
+    # reads of a few columns never touch the table rows. They lead with the same
+    # (player, season, session) and end in the paID rowid, so they replace the
+    # step 1 per-player indexes
+    [
+        '''CREATE INDEX IF NOT EXISTS idx_pa_hitter_columns ON plate_appearances
+           (hitterID, season, session, gameID, pitch, swing, diff, inning, outs, obc, pitcherID, pa_type)''',
+        '''CREATE INDEX IF NOT EXISTS idx_pa_pitcher_columns ON plate_appearances
+           (pitcherID, season, session, gameID, pitch, swing, diff, inning, outs, obc, hitterID, pa_type)''',
+        'DROP INDEX IF EXISTS idx_pa_hitter',
+        'DROP INDEX IF EXISTS idx_pa_pitcher',
+    ],
+    # 4: which process is running a sync and when it last showed signs of life,
+    # so a sync still running elsewhere isn't taken for an interrupted one
+    [
+        'ALTER TABLE sync_runs ADD COLUMN owner TEXT',
+        'ALTER TABLE sync_runs ADD COLUMN heartbeat TEXT',
+    ],
+]
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """Apply any pending MIGRATIONS in place, one transaction per step. Returns the new version"""
+    version = get_schema_version(conn)
+    for target in range(version + 1, len(MIGRATIONS) + 1):
+        conn.execute('BEGIN')
+        try:
+            for statement in MIGRATIONS[target - 1]:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Migrated baseball.db to schema version {target}")
+        version = target
+    return version
 
 def check_player_exists(player_id, conn):
     """Check if player's data already exists in database"""
@@ -87,168 +208,863 @@ def refresh_player_data(player_id, conn):
     count = c.fetchone()[0]
     return count > 0
 
-def getPlayerBattingPlateAppearances(playerID, conn):
-    """Returns batting plate appearances, refreshing existing data"""
-    plateAppearances = []
-    response = requests.get(f'https://www.rslashfakebaseball.com/api/plateappearances/batting/mlr/{playerID}')
-    if response.status_code == 200:
-        pa_data = response.json()
-        for pa in pa_data:
+def fetchPlayerPlateAppearances(playerID, pa_type, fetcher=None, revalidate=False):
+    """Download a player's 'batting' or 'pitching' feed to disk.
+
+    Returns a fetcher.Body to stream records from, or None if there is no feed.
+    revalidate checks a cached copy with the server even if it is still fresh.
+    """
+    fetcher = fetcher or get_fetcher()
+    return fetcher.fetch(f'/api/plateappearances/{pa_type}/mlr/{playerID}', revalidate)
+
+# Column identifying the player in each feed
+ROLE_COLUMNS = {'batting': 'hitterID', 'pitching': 'pitcherID'}
+
+def get_sync_watermark(player_id, pa_type, conn):
+    """Returns (paID, season, session) of the newest PA stored for a player's feed.
+
+    Databases synced before sync_state existed fall back to plate_appearances.
+    """
+    c = conn.cursor()
+    c.execute('SELECT last_paID, season, session FROM sync_state WHERE playerID = ? AND pa_type = ?',
+              (player_id, pa_type))
+    row = c.fetchone()
+    if row:
+        return row
+    c.execute(f'''
+        SELECT paID, season, session FROM plate_appearances
+        WHERE {ROLE_COLUMNS[pa_type]} = ?
+        ORDER BY paID DESC LIMIT 1
+    ''', (player_id,))
+    return c.fetchone() or (0, None, None)
+
+def update_sync_state(player_id, pa_type, newest, conn):
+    """Advance a player's watermark to newest (paID, season, session); it never moves backwards"""
+    last_paID, season, session = get_sync_watermark(player_id, pa_type, conn)
+    if newest is not None and newest[0] > last_paID:
+        last_paID, season, session = newest
+    conn.execute('''
+        INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?, datetime('now'))
+    ''', (player_id, pa_type, last_paID, season, session))
+
+def get_stored_pa_ids(player_id, pa_type, conn):
+    """paIDs already stored for a player's feed, whichever feed originally wrote them"""
+    c = conn.cursor()
+    c.execute(f'SELECT paID FROM plate_appearances WHERE {ROLE_COLUMNS[pa_type]} = ?', (player_id,))
+    return {row[0] for row in c.fetchall()}
+
+def record_feed_membership(pa_type, pa_ids, conn):
+    """Note that pa_ids appear in a pa_type feed without touching the PA rows themselves"""
+    conn.executemany('INSERT OR IGNORE INTO pa_feeds VALUES (?, ?)',
+                     ((pa_id, pa_type) for pa_id in pa_ids))
+
+class FeedParse:
+    """Turns one feed's records into new plate_appearances rows.
+
+    Every PA shows up in both the batter's and the pitcher's feed, so records
+    whose paID is already stored are skipped before parsing and only their feed
+    membership is kept. In incremental mode records at or below the stored
+    watermark are skipped too. Parses running side by side can share a claimed
+    set: paIDs one of them has already turned into a row are not yet stored, but
+    are skipped by the others all the same. Iterate to get row tuples, then call
+    finish() inside the transaction that commits them.
+    """
+    def __init__(self, player_id, pa_type, records, conn, incremental=False, claimed=None):
+        self.player_id = player_id
+        self.pa_type = pa_type
+        self.records = records
+        self.incremental = incremental
+        self.last_paID = get_sync_watermark(player_id, pa_type, conn)[0] if incremental else 0
+        self.known_ids = get_stored_pa_ids(player_id, pa_type, conn)
+        self.claimed = claimed
+        self.feed_ids = []
+        self.newest = None
+        self.count = 0
+
+    def __iter__(self):
+        for pa in self.records:
             try:
-                pa_obj = PlateAppearance(    
-                    pa['paID'], pa['league'], pa['season'], pa['session'],
-                    pa['gameID'], pa['inning'], pa['inningID'], pa['playNumber'],
-                    pa['outs'], pa['obc'], pa['awayScore'], pa['homeScore'],
-                    pa['pitcherTeam'], pa['pitcherName'], pa['pitcherID'],
-                    pa['hitterTeam'], pa['hitterName'], pa['hitterID'],
-                    pa['pitch'], pa['swing'], pa['diff'], pa['exactResult'],
-                    pa['oldResult'], pa['resultAtNeutral'], pa['resultAllNeutral'],
-                    pa['rbi'], pa['run'], pa['batterWPA'], pa['pitcherWPA'],
-                    pa['pr3B'], pa['pr2B'], pa['pr1B'], pa['prAB']
-                )
-                plateAppearances.append(pa_obj)
-                save_plate_appearance(pa_obj, 'batting', conn)
+                pa_id = pa.get('paID') or 0
+                if self.incremental and pa_id <= self.last_paID:
+                    continue
+                if pa_id in self.known_ids or (self.claimed is not None and pa_id in self.claimed):
+                    self._seen(pa_id, pa.get('season'), pa.get('session'))
+                    continue
+                row = tuple(pa[field] for field in PA_FIELDS) + (self.pa_type,)
             except Exception as e:
                 print(f"Error processing PA: {pa}")
                 print(f"Error: {str(e)}")
-    return plateAppearances
+                continue
+            if self.claimed is not None:
+                # Two parses can both get here for one paID; INSERT OR IGNORE keeps the first
+                self.claimed.add(row[0])
+            self._seen(row[0], row[2], row[3])
+            self.count += 1
+            yield row
+
+    def _seen(self, pa_id, season, session):
+        self.feed_ids.append(pa_id)
+        if self.newest is None or pa_id > self.newest[0]:
+            self.newest = (pa_id, season, session)
+
+    def finish(self, conn):
+        """Record feed membership and advance the watermark (the caller commits)"""
+        record_feed_membership(self.pa_type, self.feed_ids, conn)
+        update_sync_state(self.player_id, self.pa_type, self.newest, conn)
 
-def getPlayerPitchingPlateAppearances(playerID, conn):
-    """Returns pitching plate appearances, refreshing existing data"""
+def sync_player_plate_appearances(player_id, pa_type, records, conn, incremental=False, as_list=False):
+    """Stream a feed's records into the database and advance its watermark.
+
+    Records are turned straight into row tuples and written in batches, so memory
+    stays flat however long the history is. Returns the number of rows written,
+    or the new PlateAppearance objects if as_list is set.
+    """
+    parse = FeedParse(player_id, pa_type, records, conn, incremental)
     plateAppearances = []
-    response = requests.get(f'https://www.rslashfakebaseball.com/api/plateappearances/pitching/mlr/{playerID}')
-    if response.status_code == 200:
-        pa_data = response.json()
-        for pa in pa_data:
+
+    def rows():
+        for row in parse:
+            plateAppearances.append(PlateAppearance._make(row[:-1]))
+            yield row
+
+    saved = write_plate_appearance_rows(rows() if as_list else parse, conn)
+    with conn:
+        parse.finish(conn)
+    return plateAppearances if as_list else saved
+
+def ingest_player_feed(player_id, pa_type, body, conn, incremental=False, as_list=False):
+    """Parse a downloaded feed incrementally into the database, then release the body"""
+    if body is None:
+        # Nothing to store, but the player is now up to date for this role
+        with conn:
+            update_sync_state(player_id, pa_type, None, conn)
+        return [] if as_list else 0
+    try:
+        return sync_player_plate_appearances(player_id, pa_type, iter_json_array(body.chunks()),
+                                             conn, incremental, as_list)
+    finally:
+        body.close()
+
+PLAYER_FRESHNESS_TTL = 10 * 60  # seconds a refreshed player is served from the database
+
+def get_player_refresh_age(player_id, conn):
+    """Seconds since the older of a player's two feeds was synced, or None if either never was"""
+    c = conn.cursor()
+    c.execute('''
+        SELECT COUNT(*), MAX(strftime('%s', 'now') - strftime('%s', last_synced))
+        FROM sync_state WHERE playerID = ?
+    ''', (player_id,))
+    feeds, age = c.fetchone()
+    return age if feeds == len(ROLE_COLUMNS) else None
+
+def is_player_fresh(player_id, ttl=PLAYER_FRESHNESS_TTL):
+    """Whether both of a player's feeds were synced within the last ttl seconds"""
+    with db.reader() as conn:
+        age = get_player_refresh_age(player_id, conn)
+    return age is not None and age < ttl
+
+def get_player_data_version(player_id, conn):
+    """A value that changes whenever PAs involving the player are written.
+
+    Stored PAs are never updated or deleted, so the count and newest paID on
+    each side of the player's history identify it exactly. Both come straight
+    from the per-player indexes.
+    """
+    c = conn.cursor()
+    version = ()
+    for column in ROLE_COLUMNS.values():
+        c.execute(f'SELECT COUNT(*), MAX(paID) FROM plate_appearances WHERE {column} = ?', (player_id,))
+        version += c.fetchone()
+    return version
+
+def player_data_version(player_id):
+    with db.reader() as conn:
+        return get_player_data_version(player_id, conn)
+
+# One in-flight refresh per player; concurrent callers share its result
+_player_refreshes = SingleFlight()
+
+def refresh_player(player_id, fetcher=None, force=False):
+    """Re-download both of a player's feeds and ingest them. Returns the rows written.
+
+    Concurrent refreshes of the same player (two users picking the same
+    pitcher, or a lookup racing the background scheduler) share one download
+    and write. The downloads happen before the shared writer is taken, so a
+    slow response never holds up other writers. force revalidates cached
+    responses with the server instead of reusing them while they are fresh;
+    a forced refresh never joins an unforced one.
+    """
+    return _player_refreshes.do((player_id, force), _refresh_player, player_id, fetcher, force)
+
+def _refresh_player(player_id, fetcher, force):
+    fetcher = fetcher or get_fetcher()
+    batting_body = fetchPlayerPlateAppearances(player_id, 'batting', fetcher, force)
+    pitching_body = fetchPlayerPlateAppearances(player_id, 'pitching', fetcher, force)
+    with db.writer() as conn:
+        return (ingest_player_feed(player_id, 'batting', batting_body, conn) +
+                ingest_player_feed(player_id, 'pitching', pitching_body, conn))
+
+def getPlayerBattingPlateAppearances(playerID, conn, fetcher=None, as_list=False):
+    """Refresh a player's batting plate appearances.
+
+    Returns the number of rows written, or the PlateAppearance objects if as_list is set.
+    """
+    body = fetchPlayerPlateAppearances(playerID, 'batting', fetcher)
+    return ingest_player_feed(playerID, 'batting', body, conn, as_list=as_list)
+
+def getPlayerPitchingPlateAppearances(playerID, conn, fetcher=None, as_list=False):
+    """Refresh a player's pitching plate appearances.
+
+    Returns the number of rows written, or the PlateAppearance objects if as_list is set.
+    """
+    body = fetchPlayerPlateAppearances(playerID, 'pitching', fetcher)
+    return ingest_player_feed(playerID, 'pitching', body, conn, as_list=as_list)
+
+# A PA already stored from the other player's feed keeps its original row
+PA_INSERT_SQL = '''
+    INSERT OR IGNORE INTO plate_appearances VALUES 
+    (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+PA_BATCH_SIZE = 1000
+
+def plate_appearance_row(pa_obj, pa_type):
+    """Column tuple for a plate_appearances row"""
+    return tuple(pa_obj) + (pa_type,)
+
+def save_plate_appearance(pa_obj, pa_type, conn):
+    """Save a single plate appearance to database using provided connection"""
+    save_plate_appearances([pa_obj], pa_type, conn)
+
+def save_plate_appearances(pa_objs, pa_type, conn, batch_size=PA_BATCH_SIZE):
+    """Save plate appearances in batches, one transaction per batch. Returns the number saved"""
+    rows = (plate_appearance_row(pa_obj, pa_type) for pa_obj in pa_objs)
+    return write_plate_appearance_rows(rows, conn, batch_size)
+
+def write_plate_appearance_rows(rows, conn, batch_size=PA_BATCH_SIZE):
+    """Write an iterable of row tuples in batches, one transaction per batch.
+
+    Only one batch is materialised at a time. If a batch fails it is rolled back
+    and replayed row by row, so a bad record only costs itself rather than the
+    rows around it. Returns the number saved.
+    """
+    rows = iter(rows)
+    saved = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        try:
+            with conn:
+                saved += conn.executemany(PA_INSERT_SQL, batch).rowcount
+        except Exception as e:
+            print(f"Error saving PA batch, retrying row by row: {str(e)}")
+            saved += _save_rows_individually(batch, conn)
+    return saved
+
+def _save_rows_individually(rows, conn):
+    saved = 0
+    with conn:
+        for row in rows:
             try:
-                pa_obj = PlateAppearance(    
-                    pa['paID'], pa['league'], pa['season'], pa['session'],
-                    pa['gameID'], pa['inning'], pa['inningID'], pa['playNumber'],
-                    pa['outs'], pa['obc'], pa['awayScore'], pa['homeScore'],
-                    pa['pitcherTeam'], pa['pitcherName'], pa['pitcherID'],
-                    pa['hitterTeam'], pa['hitterName'], pa['hitterID'],
-                    pa['pitch'], pa['swing'], pa['diff'], pa['exactResult'],
-                    pa['oldResult'], pa['resultAtNeutral'], pa['resultAllNeutral'],
-                    pa['rbi'], pa['run'], pa['batterWPA'], pa['pitcherWPA'],
-                    pa['pr3B'], pa['pr2B'], pa['pr1B'], pa['prAB']
-                )
-                plateAppearances.append(pa_obj)
-                save_plate_appearance(pa_obj, 'pitching', conn)
+                saved += conn.execute(PA_INSERT_SQL, row).rowcount
             except Exception as e:
-                print(f"Error processing PA: {pa}")
-                print(f"Error: {str(e)}")
-    return plateAppearances
+                print(f"Error saving PA: {str(e)}")
+                print(f"PA data: {row}")
+    return saved
 
-def save_plate_appearance(pa_obj, pa_type, conn):
-    """Save plate appearance to database using provided connection"""
+# Checkpoints: sync_progress holds the latest status of every player's batting
+# and pitching feed. A feed is marked 'pending' when a run plans it and 'done'
+# in the same transaction that commits its rows, so after a crash anything
+# not 'done' is exactly what is left to do.
+#
+# A running sync heartbeats its sync_runs row. An unfinished run whose
+# heartbeat has gone quiet for SYNC_STALE_AFTER seconds was interrupted; one
+# that is still beating belongs to a sync running in another process, unless
+# that process was on this host and has since died.
+SYNC_HEARTBEAT_INTERVAL = 30  # seconds
+SYNC_STALE_AFTER = 5 * 60  # seconds
+
+def sync_owner():
+    """Identifies this process in sync_runs.owner"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def start_sync_run(incremental, conn):
     c = conn.cursor()
-    
+    c.execute('''
+        INSERT INTO sync_runs (incremental, started, owner, heartbeat)
+        VALUES (?, datetime('now'), ?, datetime('now'))
+    ''', (int(incremental), sync_owner()))
+    return c.lastrowid
+
+def is_owner_dead(owner):
+    """Whether owner (a sync_owner() value) was a process on this host that no longer exists"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
     try:
-        c.execute('''
-            INSERT OR REPLACE INTO plate_appearances VALUES 
-            (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            pa_obj.paID, pa_obj.league, pa_obj.season, pa_obj.session, pa_obj.gameID,
-            pa_obj.inning, pa_obj.inningID, pa_obj.playNumber, pa_obj.outs, pa_obj.obc,
-            pa_obj.awayScore, pa_obj.homeScore, pa_obj.pitcherTeam, pa_obj.pitcherName,
-            pa_obj.pitcherID, pa_obj.hitterTeam, pa_obj.hitterName, pa_obj.hitterID,
-            pa_obj.pitch, pa_obj.swing, pa_obj.diff, pa_obj.exactResult, pa_obj.oldResult,
-            pa_obj.resultAtNeutral, pa_obj.resultAllNeutral, pa_obj.rbi, pa_obj.run,
-            pa_obj.batterWPA, pa_obj.pitcherWPA, pa_obj.pr3B, pa_obj.pr2B, pa_obj.pr1B,
-            pa_obj.prAB, pa_type
-        ))
-        conn.commit()  # Commit after each insert
-    except Exception as e:
-        print(f"Error saving PA: {str(e)}")
-        print(f"PA data: {pa_obj.__dict__}")
-        conn.rollback()
-
-def getPlayers():
-    """Get all players, updating database with any new ones"""
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # Exists, but belongs to another user
+        return False
+    return False
+
+def claim_sync_run(run_id, owner, conn, stale_after=SYNC_STALE_AFTER):
+    """Take over an interrupted run last held by owner.
+
+    False if the owner came back or another process claimed it first.
+    """
+    c = conn.cursor()
+    c.execute('''
+        UPDATE sync_runs SET owner = ?, heartbeat = datetime('now')
+        WHERE runID = ? AND finished IS NULL AND owner IS ?
+        AND (heartbeat IS NULL OR heartbeat < datetime('now', ?) OR ?)
+    ''', (sync_owner(), run_id, owner, f'-{stale_after} seconds', is_owner_dead(owner)))
+    return c.rowcount == 1
+
+def heartbeat_sync_run(run_id, conn):
+    conn.execute("UPDATE sync_runs SET heartbeat = datetime('now') WHERE runID = ?", (run_id,))
+
+def finish_sync_run(run_id, conn):
+    conn.execute("UPDATE sync_runs SET finished = datetime('now') WHERE runID = ?", (run_id,))
+
+def get_unfinished_run(conn, stale_after=SYNC_STALE_AFTER):
+    """(runID, owner, live) of the latest sync that never finished, or None.
+
+    live is true while the run's heartbeat is newer than stale_after seconds,
+    meaning its owner is most likely still running it. A run whose owner was a
+    process on this host that has exited is not live however recent its last
+    heartbeat, and neither are runs from before heartbeats existed.
+    """
+    c = conn.cursor()
+    c.execute('''
+        SELECT runID, finished, owner, heartbeat >= datetime('now', ?)
+        FROM sync_runs ORDER BY runID DESC LIMIT 1
+    ''', (f'-{stale_after} seconds',))
+    row = c.fetchone()
+    if not row or row[1] is not None:
+        return None
+    return row[0], row[2], bool(row[3]) and not is_owner_dead(row[2])
+
+class SyncHeartbeat:
+    """Context manager that heartbeats a sync run from a background thread until the block exits"""
+    def __init__(self, run_id, interval=SYNC_HEARTBEAT_INTERVAL):
+        self.run_id = run_id
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._beat, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _beat(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with db.writer() as conn:
+                    heartbeat_sync_run(self.run_id, conn)
+            except Exception as e:
+                print(f"Error updating sync heartbeat: {str(e)}")
+
+def get_incomplete_feeds(conn):
+    """(playerID, pa_type) of every feed a previous sync planned or failed but never finished"""
+    c = conn.cursor()
+    c.execute("SELECT playerID, pa_type FROM sync_progress WHERE status != 'done'")
+    return set(c.fetchall())
+
+def plan_checkpoints(run_id, feeds, conn):
+    conn.executemany('''
+        INSERT OR REPLACE INTO sync_progress VALUES (?, ?, ?, 'pending', NULL, datetime('now'))
+    ''', ((player_id, pa_type, run_id) for player_id, pa_type in feeds))
+
+def mark_checkpoint(run_id, player_id, pa_type, status, conn, error=None):
+    conn.execute('''
+        INSERT OR REPLACE INTO sync_progress VALUES (?, ?, ?, ?, ?, datetime('now'))
+    ''', (player_id, pa_type, run_id, status, error))
+
+PIPELINE_WRITE_QUEUE_SIZE = 8  # row batches waiting for the writer
+PIPELINE_FLUSH_INTERVAL = 0.25  # seconds the writer waits for a full batch before committing a partial one
+
+class StageStats:
+    """Items handled, busy time and peak queue depth for one pipeline stage"""
+    def __init__(self, name, unit, workers):
+        self.name = name
+        self.unit = unit
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.items = 0
+        self.busy = 0.0
+        self.peak_queue = 0
+
+    def record(self, items, busy):
+        with self.lock:
+            self.items += items
+            self.busy += busy
+
+    def queue_depth(self, depth):
+        # Unlocked on purpose: a slightly stale peak is fine for a diagnostic
+        if depth > self.peak_queue:
+            self.peak_queue = depth
+
+    def summary(self, elapsed):
+        with self.lock:
+            rate = self.items / elapsed if elapsed else 0
+            utilisation = self.busy / (elapsed * self.workers) if elapsed else 0
+            return (f"{self.name}: {self.items} {self.unit} ({rate:,.0f}/sec), "
+                    f"{self.workers} worker(s) {utilisation:.0%} busy, input queue peak {self.peak_queue}")
+
+class IngestPipeline:
+    """Fetch, parse and write players' PA feeds as three concurrent stages.
+
+    Fetch threads download feeds to disk and hand the bodies to the parse stage,
+    which streams them into row batches for a single writer thread. The writer
+    commits rows from many feeds per transaction, taking the shared writer only
+    for the commit itself. Both hand-offs are bounded queues, so a slow writer
+    stalls parsing and then fetching instead of letting bodies or rows pile up.
+    on_player_done(player_id, rows) runs once all of a player's feeds are
+    committed; feeds that failed are listed in failures instead. With a run_id
+    each feed's sync_progress checkpoint is updated as it completes or fails.
+    Parse workers share the paIDs they have claimed, so a PA in both the
+    batter's and the pitcher's feed is parsed once even when neither feed has
+    committed yet. A feed that fails after claiming rows is retried by the next
+    sync, which writes whatever it lost.
+    """
+    def __init__(self, fetcher, incremental=False, parse_workers=1, batch_size=PA_BATCH_SIZE,
+                 on_player_done=None, run_id=None):
+        self.fetcher = fetcher
+        self.incremental = incremental
+        self.parse_workers = max(1, parse_workers)
+        self.batch_size = batch_size
+        self.on_player_done = on_player_done
+        self.run_id = run_id
+        self.tasks = queue.Queue()
+        self.parse_queue = queue.Queue(maxsize=fetcher.max_workers * 2)
+        self.write_queue = queue.Queue(maxsize=PIPELINE_WRITE_QUEUE_SIZE)
+        self.stop = threading.Event()
+        self.error = None
+        self.lock = threading.Lock()
+        self.pending = {}  # player_id -> feeds not yet committed
+        self.written = {}  # player_id -> rows committed so far
+        self.failures = []  # (player_id, pa_type, reason)
+        self.claimed = set()  # paIDs parsed into rows during this run
+        self.fetch_stats = StageStats('fetch', 'feeds', fetcher.max_workers)
+        self.parse_stats = StageStats('parse', 'rows', self.parse_workers)
+        self.write_stats = StageStats('write', 'rows', 1)
+        self.elapsed = 0.0
+
+    def run(self, feeds):
+        """Sync each (player_id, pa_type) feed in feeds. Returns the rows written"""
+        for player_id, pa_type in feeds:
+            self.pending.setdefault(player_id, set()).add(pa_type)
+            self.written[player_id] = 0
+            self.tasks.put((player_id, pa_type))
+        
+        self.fetch_stats.queue_depth(self.tasks.qsize())
+        start = time.perf_counter()
+        fetchers = self._start(self._fetch_worker, self.fetcher.max_workers)
+        parsers = self._start(self._parse_worker, self.parse_workers)
+        writers = self._start(self._write_worker, 1)
+        try:
+            # Shut down front to back: each stage drains its input before the
+            # sentinel behind it tells the next stage there is no more to come
+            self._join(fetchers)
+            for _ in parsers:
+                self._put(self.parse_queue, None)
+            self._join(parsers)
+            self._put(self.write_queue, None)
+            self._join(writers)
+        except BaseException:
+            self.stop.set()
+            raise
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self._discard_bodies()
+        if self.error is not None:
+            raise self.error
+        return sum(self.written.values())
+
+    def _start(self, target, count):
+        threads = [threading.Thread(target=self._guard, args=(target,), daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _join(self, threads):
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.1)
+
+    def _guard(self, target):
+        # An unexpected error in any stage stops the whole pipeline; run() re-raises it
+        try:
+            target()
+        except Exception as e:
+            with self.lock:
+                if self.error is None:
+                    self.error = e
+            self.stop.set()
+
+    def _put(self, q, item):
+        """Blocking put that gives up once the pipeline is stopping. Returns whether it was queued"""
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q, timeout=None):
+        """Blocking get that gives up once the pipeline is stopping (raises queue.Empty)"""
+        waited = 0.0
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                waited += 0.1
+                if timeout is not None and waited >= timeout:
+                    raise
+        raise queue.Empty
+
+    def _fetch_worker(self):
+        while not self.stop.is_set():
+            try:
+                player_id, pa_type = self.tasks.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            try:
+                body = fetchPlayerPlateAppearances(player_id, pa_type, self.fetcher)
+            except Exception as e:
+                print(f"Error fetching {pa_type} PAs for {player_id}: {str(e)}")
+                self._put(self.write_queue, ('failed', (player_id, pa_type), str(e)))
+                continue
+            finally:
+                self.fetch_stats.record(1, time.perf_counter() - started)
+            if body is None:
+                # No feed for this role; still worth a checkpoint
+                self._put(self.write_queue, ('done', (player_id, pa_type), None))
+                continue
+            self.parse_stats.queue_depth(self.parse_queue.qsize())
+            if not self._put(self.parse_queue, (player_id, pa_type, body)):
+                body.close()
+
+    def _parse_worker(self):
+        while True:
+            item = self._get(self.parse_queue)
+            if item is None:
+                return
+            player_id, pa_type, body = item
+            started = time.perf_counter()
+            try:
+                with db.reader() as conn:
+                    parse = FeedParse(player_id, pa_type, iter_json_array(body.chunks()),
+                                      conn, self.incremental, self.claimed)
+                rows = iter(parse)
+                while True:
+                    batch = list(islice(rows, self.batch_size))
+                    if not batch:
+                        break
+                    self.parse_stats.record(len(batch), time.perf_counter() - started)
+                    self.write_stats.queue_depth(self.write_queue.qsize())
+                    if not self._put(self.write_queue, ('rows', (player_id, pa_type), batch)):
+                        return
+                    started = time.perf_counter()
+                self.parse_stats.record(0, time.perf_counter() - started)
+                self._put(self.write_queue, ('done', (player_id, pa_type), parse))
+            except Exception as e:
+                print(f"Error parsing {pa_type} PAs for {player_id}: {str(e)}")
+                self._put(self.write_queue, ('failed', (player_id, pa_type), str(e)))
+            finally:
+                body.close()
+
+    def _write_worker(self):
+        segments = []  # (feed, rows) in arrival order
+        finished = []  # (kind, feed, FeedParse / None or failure reason)
+        buffered = 0
+        while True:
+            try:
+                message = self._get(self.write_queue, timeout=PIPELINE_FLUSH_INTERVAL)
+            except queue.Empty:
+                if self.stop.is_set():
+                    return
+                message = 'idle'
+            if message in (None, 'idle') or buffered >= self.batch_size:
+                if segments or finished:
+                    self._flush(segments, finished)
+                    segments, finished, buffered = [], [], 0
+                if message is None:
+                    return
+                if message == 'idle':
+                    continue
+            kind, feed, payload = message
+            if kind == 'rows':
+                segments.append((feed, payload))
+                buffered += len(payload)
+            else:
+                finished.append((kind, feed, payload))
+
+    def _flush(self, segments, finished):
+        """Commit buffered rows plus the bookkeeping of the feeds they complete in one transaction"""
+        started = time.perf_counter()
+        counts = {}
+        with db.writer() as conn:
+            try:
+                with conn:
+                    for feed, rows in segments:
+                        counts[feed] = counts.get(feed, 0) + conn.executemany(PA_INSERT_SQL, rows).rowcount
+                    self._finish_feeds(finished, conn)
+            except Exception as e:
+                print(f"Error saving PA batch, retrying row by row: {str(e)}")
+                counts = {}
+                for feed, rows in segments:
+                    counts[feed] = counts.get(feed, 0) + _save_rows_individually(rows, conn)
+                with conn:
+                    self._finish_feeds(finished, conn)
+        self.write_stats.record(sum(counts.values()), time.perf_counter() - started)
+        
+        for (player_id, pa_type), rows in counts.items():
+            with self.lock:
+                self.written[player_id] += rows
+        for kind, (player_id, pa_type), payload in finished:
+            if kind == 'done':
+                self._feed_done(player_id, pa_type, 0)
+            else:
+                self._feed_failed(player_id, pa_type, payload)
+
+    def _finish_feeds(self, finished, conn):
+        for kind, (player_id, pa_type), payload in finished:
+            if kind == 'done' and payload is not None:
+                payload.finish(conn)
+            elif kind == 'done':
+                update_sync_state(player_id, pa_type, None, conn)
+            if self.run_id is not None:
+                error = payload if kind == 'failed' else None
+                mark_checkpoint(self.run_id, player_id, pa_type, kind, conn, error)
+
+    def _feed_done(self, player_id, pa_type, rows):
+        with self.lock:
+            self.written[player_id] += rows
+            pending = self.pending[player_id]
+            pending.discard(pa_type)
+            complete = not pending
+            failed = any(failure[0] == player_id for failure in self.failures)
+        if complete and not failed and self.on_player_done is not None:
+            self.on_player_done(player_id, self.written[player_id])
+
+    def _feed_failed(self, player_id, pa_type, reason):
+        with self.lock:
+            self.failures.append((player_id, pa_type, reason))
+            self.pending[player_id].discard(pa_type)
+
+    def _discard_bodies(self):
+        # Bodies left behind by a stopped pipeline may be temporary spool files
+        while True:
+            try:
+                item = self.parse_queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[2].close()
+
+    def print_summary(self):
+        for stats in (self.fetch_stats, self.parse_stats, self.write_stats):
+            print(stats.summary(self.elapsed))
+        if self.failures:
+            print(f"{len(self.failures)} feed(s) failed")
+
+def getPlayers(fetcher=None, incremental=False, resume=False):
+    """Get all players, updating database with any new ones.
+
+    With incremental=True every player on the roster is refreshed, writing only
+    PAs newer than their sync_state watermark. Feeds an earlier sync failed or
+    never reached are always retried. With resume=True a sync that was
+    interrupted is continued instead of a new one being started: its unfinished
+    feeds go first, then this sync's own. Nothing is synced while another
+    process's sync is still running.
+    """
     init_db()
+    fetcher = fetcher or get_fetcher()
     players = []
     
     # Get existing players from database
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    c.execute('SELECT playerID FROM players')
-    existing_ids = {row[0] for row in c.fetchall()}
+    with db.reader() as conn:
+        c = conn.cursor()
+        c.execute('SELECT playerID FROM players')
+        existing_ids = {row[0] for row in c.fetchall()}
+        incomplete = get_incomplete_feeds(conn)
+        unfinished = get_unfinished_run(conn)
+    
+    if unfinished is not None and unfinished[2]:
+        print(f"Sync run {unfinished[0]} is still running in {unfinished[1]}; not starting another")
+        return players
+    resume_run = unfinished[0] if resume and unfinished is not None else None
     
-    response = requests.get('https://www.rslashfakebaseball.com/api/players')
-    if response.status_code == 200:
-        player_data = response.json()
+    player_data = fetcher.get_json('/api/players')
+    if player_data is not None:
+        sync_players = {}
+        player_names = {}
         
-        for player in player_data:
-            player_obj = Player(
-                player['playerID'],
-                player['playerName'], 
-                player['Team'],
-                player['batType'],
-                player['pitchType'],
-                player['pitchBonus'],
-                player['hand'],
-                player['priPos'],
-                player['secPos'],
-                player['tertPos'],
-                player['redditName'],
-                player['discordName'], 
-                player['discordID'],
-                player['status'],
-                player['posValue']
-            )
-            players.append(player_obj)
+        with db.writer() as conn:
+            c = conn.cursor()
+            for player in player_data:
+                player_obj = Player._make(player[field] for field in PLAYER_FIELDS)
+                players.append(player_obj)
             
-            # Only insert if player is new or update if status might have changed
-            c.execute('''
-                INSERT OR REPLACE INTO players VALUES 
-                (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                player['playerID'],
-                player['playerName'],
-                player['Team'],
-                player['batType'],
-                player['pitchType'],
-                player['pitchBonus'],
-                player['hand'],
-                player['priPos'],
-                player['secPos'],
-                player['tertPos'],
-                player['redditName'],
-                player['discordName'],
-                player['discordID'],
-                player['status'],
-                player['posValue']
-            ))
+                # Only insert if player is new or update if status might have changed
+                c.execute('''
+                    INSERT OR REPLACE INTO players VALUES 
+                    (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    player['playerID'],
+                    player['playerName'],
+                    player['Team'],
+                    player['batType'],
+                    player['pitchType'],
+                    player['pitchBonus'],
+                    player['hand'],
+                    player['priPos'],
+                    player['secPos'],
+                    player['tertPos'],
+                    player['redditName'],
+                    player['discordName'],
+                    player['discordID'],
+                    player['status'],
+                    player['posValue']
+                ))
             
-            # Only fetch PAs for new players
-            if player['playerID'] not in existing_ids:
-                print(f"Fetching data for new player: {player['playerName']}")
-                getPlayerBattingPlateAppearances(player['playerID'], conn)
-                getPlayerPitchingPlateAppearances(player['playerID'], conn)
+                # Only fetch PAs for new players unless refreshing incrementally
+                player_names[player['playerID']] = player['playerName']
+                if incremental or player['playerID'] not in existing_ids:
+                    sync_players[player['playerID']] = player['playerName']
+        
+            feeds = [(player_id, pa_type) for player_id in sync_players for pa_type in ('batting', 'pitching')]
+            if resume_run is None:
+                feeds += sorted(feed for feed in incomplete if feed[0] not in sync_players)
+                run_id = start_sync_run(incremental, conn)
+            else:
+                # Finish what the interrupted run left first, then this sync's own pass
+                feeds = sorted(incomplete) + [feed for feed in feeds if feed not in incomplete]
+                run_id = resume_run if claim_sync_run(resume_run, unfinished[1], conn) else None
+            if run_id is not None:
+                plan_checkpoints(run_id, feeds, conn)
+        
+        # The roster sync is complete once the player rows are committed
+        invalidate_roster()
+        
+        if run_id is None:
+            print(f"Sync run {resume_run} was picked up by another process; not starting another")
+            return players
+        if resume_run is not None:
+            print(f"Resuming sync run {run_id}: {len(incomplete)} feeds left, {len(feeds)} in all")
+        
+        def player_done(player_id, rows):
+            name = player_names.get(player_id, player_id)
+            if player_id not in existing_ids:
+                print(f"Fetching data for new player: {name}")
+            elif rows:
+                print(f"Added {rows} new PAs for {name}")
         
-        conn.commit()
+        with SyncHeartbeat(run_id):
+            pipeline = IngestPipeline(fetcher, incremental, on_player_done=player_done, run_id=run_id)
+            pipeline.run(feeds)
+            pipeline.print_summary()
+        
+            # Give failed feeds one more pass now the rest of the league is done;
+            # anything still failing stays checkpointed for the next sync
+            if pipeline.failures:
+                retry = [(player_id, pa_type) for player_id, pa_type, _ in pipeline.failures]
+                print(f"Retrying {len(retry)} failed feeds")
+                pipeline = IngestPipeline(fetcher, incremental, on_player_done=player_done, run_id=run_id)
+                pipeline.run(retry)
+                pipeline.print_summary()
+        
+            with db.writer() as conn:
+                finish_sync_run(run_id, conn)
     
-    conn.close()
     return players
 
+_roster = None
+_roster_lock = threading.Lock()
+
+def get_roster():
+    """All players stored in baseball.db, as a tuple of Player.
+
+    Read-only and network-free. The result is cached in-process until
+    invalidate_roster() runs, which every sync does when it finishes.
+    """
+    global _roster
+    with _roster_lock:
+        if _roster is None:
+            with db.reader() as conn:
+                c = conn.cursor()
+                c.execute('''
+                    SELECT playerID, playerName, team, batType, pitchType, pitchBonus,
+                           hand, priPos, secPos, tertPos, redditName, discordName,
+                           discordID, status, posValue
+                    FROM players
+                    ORDER BY playerID
+                ''')
+                _roster = tuple(map(Player._make, c.fetchall()))
+        return _roster
+
+def invalidate_roster():
+    global _roster
+    with _roster_lock:
+        _roster = None
+
 def getTeams():
-    teams = set()
-    for player in getPlayers():
-        teams.add(player.Team)
-    return teams
+    """Team names on the stored roster (no network I/O; run a sync to refresh)"""
+    return {player.Team for player in get_roster()}
 
 def getPlateAppearances():
-    plateAppearances = {}
-    for player in getPlayers():
-        plateAppearances[player.playerID] = player.playerID
-    return plateAppearances
+    """Stored player IDs keyed by player ID (no network I/O; run a sync to refresh)"""
+    return {player.playerID: player.playerID for player in get_roster()}
 
-def main():
+def sync(fetcher=None, incremental=False, resume=False):
+    """Update the database through fetcher, the shared Fetcher by default.
+
+    This is what the bot runs: it leaves the shared Fetcher alone, since
+    player refreshes and the scheduler may be using it at the same time.
+    """
     init_db()
     print("Updating player database...")
-    getPlayers()
+    fetcher = fetcher or get_fetcher()
+    getPlayers(fetcher, incremental, resume)
+    fetcher.stats.print_summary()
     print("Database update complete!")
 
+def main(base_url=API_BASE, max_workers=DEFAULT_MAX_WORKERS,
+         requests_per_second=DEFAULT_REQUESTS_PER_SECOND, incremental=False,
+         cache_dir=CACHE_DIR, cache_ttl=DEFAULT_TTL, resume=False):
+    """Command-line sync: replaces the shared Fetcher with one built from these settings"""
+    fetcher = configure_fetcher(base_url, max_workers, requests_per_second, cache_dir, cache_ttl)
+    sync(fetcher, incremental, resume)
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Sync baseball.db with the rslashfakebaseball API')
+    parser.add_argument('--base-url', default=API_BASE,
+                        help='API host to sync from (e.g. a local stub server)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help='Maximum concurrent downloads')
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help='Maximum requests per second per host (0 for unlimited)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Refresh every player, writing only PAs newer than the stored watermark')
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help='Directory for cached API responses')
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_TTL,
+                        help='Seconds to reuse a cached response before revalidating it')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Bypass the response cache entirely')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted sync instead of starting over')
+    args = parser.parse_args()
+    main(args.base_url, args.workers, args.rate, args.incremental,
+         None if args.no_cache else args.cache_dir, args.cache_ttl, args.resume)
 
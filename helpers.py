@@ -1,4 +1,4 @@
-import sqlite3
+import db
 
 def calculate_delta(first_num, second_num):
     value = second_num - first_num
@@ -8,6 +8,13 @@ def calculate_delta(first_num, second_num):
         value = value + 1000
     return value
 
+def calculate_deltas(first, second):
+    """calculate_delta over two NumPy arrays at once"""
+    value = second - first
+    value[value > 500] -= 1000
+    value[value <= -500] += 1000
+    return value
+
 def get_result_color(result):
     """Returns color code for different batting results"""
     if not result or result == 'N/A':
@@ -73,20 +80,19 @@ def get_result_color(result):
 
 def get_all_possible_results():
     """Returns a list of all unique results found in the database"""
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    
-    # Get all unique results from both exactResult and oldResult columns
-    c.execute('''
-        SELECT DISTINCT exactResult FROM plate_appearances 
-        WHERE exactResult IS NOT NULL
-        UNION
-        SELECT DISTINCT oldResult FROM plate_appearances 
-        WHERE oldResult IS NOT NULL
-    ''')
-    
-    results = sorted([row[0] for row in c.fetchall()])
-    conn.close()
+    with db.reader() as conn:
+        c = conn.cursor()
+        
+        # Get all unique results from both exactResult and oldResult columns
+        c.execute('''
+            SELECT DISTINCT exactResult FROM plate_appearances 
+            WHERE exactResult IS NOT NULL
+            UNION
+            SELECT DISTINCT oldResult FROM plate_appearances 
+            WHERE oldResult IS NOT NULL
+        ''')
+        
+        results = sorted([row[0] for row in c.fetchall()])
     
     return results
 
@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+CACHE_DIR = 'http_cache'
+DEFAULT_TTL = 60  # seconds a stored response is served without revalidating
+CACHE_MAX_BYTES = 1024 * 1024 * 1024  # compressed bodies kept on disk
+CACHE_MAX_AGE = 7 * 24 * 60 * 60  # seconds an entry is kept after it was last fetched or revalidated
+PRUNE_INTERVAL = 60  # seconds between scans of the cache directory
+PRUNE_GRACE = 10 * 60  # entries used this recently are never evicted: a Body may still be reading them
+
+class ResponseCache:
+    """On-disk cache of API responses keyed by URL.
+
+    Bodies are stored gzip-compressed next to a small JSON metadata file holding
+    the validators (ETag / Last-Modified) and when it was fetched. Fresh
+    entries are served locally; stale ones are revalidated with a conditional
+    request and only re-downloaded when the server says they changed.
+
+    Entries not fetched or revalidated for max_age seconds are evicted, and so
+    are the least recently used ones while the bodies exceed max_bytes.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=CACHE_MAX_BYTES,
+                 max_age=CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.next_prune = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, suffix):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}{suffix}')
+
+    def lookup(self, url):
+        """Returns the metadata stored for url, or None if it isn't cached"""
+        try:
+            with open(self._path(url, '.meta.json'), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.body_path(url)):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        """Server-sent max-age wins; otherwise the cache's own TTL applies"""
+        if entry is None:
+            return False
+        max_age = entry.get('max_age')
+        if max_age is None:
+            max_age = self.ttl
+        return time.time() - entry.get('fetched_at', 0) < max_age
+
+    def conditional_headers(self, entry):
+        """Request headers that let the server answer 304 for an unchanged entry"""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def body_path(self, url):
+        """Path of the gzip-compressed body stored for url"""
+        return self._path(url, '.body.gz')
+
+    def cacheable(self, headers):
+        return 'no-store' not in (headers.get('Cache-Control') or '').lower()
+
+    def store_stream(self, url, chunks, headers):
+        """Compress a 200 response into the cache chunk by chunk, returning the body path"""
+        path = self.body_path(url)
+        tmp = self._tmp_path(path)
+        try:
+            with gzip.open(tmp, 'wb', compresslevel=6) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        os.replace(tmp, path)
+        cache_control = (headers.get('Cache-Control') or '').lower()
+        self._write_meta(url, {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'max_age': self._max_age(cache_control),
+            'fetched_at': time.time(),
+        })
+        self._maybe_prune()
+        return path
+
+    def revalidated(self, url, entry, headers):
+        """Extend an entry's lifetime after a 304 Not Modified"""
+        cache_control = (headers.get('Cache-Control') or '').lower()
+        entry = dict(entry, fetched_at=time.time())
+        if cache_control:
+            entry['max_age'] = self._max_age(cache_control)
+        if headers.get('ETag'):
+            entry['etag'] = headers['ETag']
+        self._write_meta(url, entry)
+        # The body's mtime is what eviction goes by
+        try:
+            os.utime(self.body_path(url))
+        except OSError:
+            pass
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        with self.lock:
+            now = time.monotonic()
+            if now < self.next_prune:
+                return
+            self.next_prune = now + PRUNE_INTERVAL
+        self.prune()
+
+    def prune(self):
+        """Evict expired entries, then the oldest until the bodies fit in max_bytes. Returns how many went"""
+        bodies = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.body.gz'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                bodies.append((stat.st_mtime, stat.st_size, entry.path[:-len('.body.gz')]))
+        total = sum(size for _, size, _ in bodies)
+        now = time.time()
+        removed = 0
+        for mtime, size, base in sorted(bodies):
+            age = now - mtime
+            if age < PRUNE_GRACE or (total <= self.max_bytes and age < self.max_age):
+                break
+            for suffix in ('.meta.json', '.body.gz'):
+                try:
+                    os.remove(base + suffix)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _max_age(cache_control):
+        if 'no-cache' in cache_control:
+            return 0
+        match = re.search(r'max-age=(\d+)', cache_control)
+        if match:
+            return int(match.group(1))
+        return None
+
+    def _write_meta(self, url, entry):
+        self._write(self._path(url, '.meta.json'), json.dumps(entry).encode('utf-8'))
+
+    @staticmethod
+    def _tmp_path(path):
+        return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    @classmethod
+    def _write(cls, path, data):
+        # Write to a private temp file and rename so concurrent readers never
+        # see a partially written entry
+        tmp = cls._tmp_path(path)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
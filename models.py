@@ -1,57 +1,37 @@
-class Player:
-    def __init__(self, playerID, playerName, Team, batType, pitchType, pitchBonus, hand,
-                 priPos, secPos, tertPos, redditName, discordName, discordID, status, posValue):
-        self.playerID = playerID
-        self.playerName = playerName
-        self.Team = Team
-        self.batType = batType
-        self.pitchType = pitchType
-        self.pitchBonus = pitchBonus
-        self.hand = hand
-        self.priPos = priPos
-        self.secPos = secPos
-        self.tertPos = tertPos
-        self.redditName = redditName
-        self.discordName = discordName
-        self.discordID = discordID
-        self.status = status
-        self.posValue = posValue
-
-class PlateAppearance:
-    def __init__(self, paID, league, season, session, gameID, inning, inningID, playNumber, outs, obc,
-                 awayScore, homeScore, pitcherTeam, pitcherName, pitcherID, hitterTeam, hitterName, hitterID,
-                 pitch, swing, diff, exactResult, oldResult, resultAtNeutral, resultAllNeutral, rbi, run,
-                 batterWPA, pitcherWPA, pr3B, pr2B, pr1B, prAB):
-        self.paID = paID
-        self.league = league
-        self.season = season
-        self.session = session
-        self.gameID = gameID
-        self.inning = inning
-        self.inningID = inningID
-        self.playNumber = playNumber
-        self.outs = outs
-        self.obc = obc
-        self.awayScore = awayScore
-        self.homeScore = homeScore
-        self.pitcherTeam = pitcherTeam
-        self.pitcherName = pitcherName
-        self.pitcherID = pitcherID
-        self.hitterTeam = hitterTeam
-        self.hitterName = hitterName
-        self.hitterID = hitterID
-        self.pitch = pitch
-        self.swing = swing
-        self.diff = diff
-        self.exactResult = exactResult
-        self.oldResult = oldResult
-        self.resultAtNeutral = resultAtNeutral
-        self.resultAllNeutral = resultAllNeutral
-        self.rbi = rbi
-        self.run = run
-        self.batterWPA = batterWPA
-        self.pitcherWPA = pitcherWPA
-        self.pr3B = pr3B
-        self.pr2B = pr2B
-        self.pr1B = pr1B
-        self.prAB = prAB
+from collections import namedtuple
+
+# Field names follow the API and the table columns, in column order
+
+PLAYER_FIELDS = (
+    'playerID', 'playerName', 'Team', 'batType', 'pitchType', 'pitchBonus', 'hand',
+    'priPos', 'secPos', 'tertPos', 'redditName', 'discordName', 'discordID', 'status', 'posValue'
+)
+
+PA_FIELDS = (
+    'paID', 'league', 'season', 'session', 'gameID', 'inning', 'inningID', 'playNumber',
+    'outs', 'obc', 'awayScore', 'homeScore', 'pitcherTeam', 'pitcherName', 'pitcherID',
+    'hitterTeam', 'hitterName', 'hitterID', 'pitch', 'swing', 'diff', 'exactResult',
+    'oldResult', 'resultAtNeutral', 'resultAllNeutral', 'rbi', 'run', 'batterWPA',
+    'pitcherWPA', 'pr3B', 'pr2B', 'pr1B', 'prAB'
+)
+
+class Player(namedtuple('Player', PLAYER_FIELDS)):
+    """A players row. Tuple-backed, so fields are read-only and there is no per-instance __dict__"""
+    __slots__ = ()
+
+class PlateAppearance(namedtuple('PlateAppearance', PA_FIELDS)):
+    """A plate_appearances row without its pa_type.
+
+    Tuple-backed like Player: analysis code loads tens of thousands of these at
+    a time, and a tuple takes a fraction of the memory of an object with a
+    __dict__ and is built in one step from a database row.
+    """
+    __slots__ = ()
+
+def player_row_factory(cursor, row):
+    """sqlite3 row factory for a SELECT of PLAYER_FIELDS in order"""
+    return Player._make(row)
+
+def plate_appearance_row_factory(cursor, row):
+    """sqlite3 row factory for a SELECT of PA_FIELDS in order"""
+    return PlateAppearance._make(row)
@@ -0,0 +1,236 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import db
+from getData import player_data_version
+from helpers import calculate_deltas
+from search_player import query_plate_appearances, ANALYSIS_COLUMNS
+
+PA_CACHE_MAX_BYTES = 32 * 1024 * 1024  # per process
+
+def _int_column(values):
+    # None becomes NaN on the way in, then 0 with a mask saying it was missing
+    column = np.array(values, dtype=float)
+    present = ~np.isnan(column)
+    return np.where(present, column, 0).astype(np.int64), present
+
+class PAColumns:
+    """One player's PAs as aligned NumPy columns, sorted by (gameID, paID).
+
+    pitch, swing and diff hold 0 where the PA had no value, with has_pitch,
+    has_swing and has_diff marking the real ones. game holds a small integer per
+    gameID, with has_game false where the gameID was empty. same_game[i] says whether PAs i and i+1 are in the same game, and
+    game_start marks the first PA of every game. chronological orders the rows
+    by paID alone, and fetched holds each row's position in the order the
+    rows were passed in (the query's, newest session first).
+    """
+    def __init__(self, pa_ids, game_ids, pitches, swings, diffs):
+        # Sorting the gameID strings once turns them into codes in the same order
+        game_ids = np.array([game_id or '' for game_id in game_ids], dtype=object)
+        _, game = np.unique(game_ids, return_inverse=True)
+        pa_id = np.array(pa_ids, dtype=np.int64)
+        order = np.lexsort((pa_id, game))
+        self.pa_id = pa_id[order]
+        self.fetched = order
+        self.game = game.reshape(-1)[order]
+        self.has_game = (game_ids != '')[order]
+        self.pitch, self.has_pitch = (column[order] for column in _int_column(pitches))
+        self.swing, self.has_swing = (column[order] for column in _int_column(swings))
+        self.diff, self.has_diff = (column[order] for column in _int_column(diffs))
+        self.same_game = self.game[:-1] == self.game[1:]
+        self.game_start = np.ones(len(self.game), dtype=bool)
+        self.game_start[1:] = ~self.same_game
+        self.chronological = np.argsort(self.pa_id, kind='stable')
+        # Instances are shared through the cache, so nobody gets to edit them
+        for column in self.arrays():
+            column.flags.writeable = False
+
+    @classmethod
+    def from_plate_appearances(cls, pas):
+        return cls([pa.paID for pa in pas], [pa.gameID for pa in pas], [pa.pitch for pa in pas],
+                   [pa.swing for pa in pas], [pa.diff for pa in pas])
+
+    def __len__(self):
+        return len(self.pa_id)
+
+    def arrays(self):
+        return [value for value in vars(self).values() if isinstance(value, np.ndarray)]
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.arrays())
+
+    def values(self, name):
+        """The non-null values of the 'pitch' or 'swing' column, in (gameID, paID) order"""
+        return getattr(self, name)[getattr(self, f'has_{name}')]
+
+    def deltas(self, name):
+        """Deltas between consecutive non-null values in paID order, as get_delta_history computes them"""
+        column = getattr(self, name)[self.chronological]
+        present = getattr(self, f'has_{name}')[self.chronological]
+        pairs = present[:-1] & present[1:]
+        return calculate_deltas(column[:-1][pairs], column[1:][pairs])
+
+    def pairs(self, first, second):
+        """Indexes i where PAs i and i+1 share a game and have first and second respectively"""
+        return np.flatnonzero(self.same_game & getattr(self, f'has_{first}')[:-1]
+                              & getattr(self, f'has_{second}')[1:])
+
+    def triples(self, first, second, third, chronological=False):
+        """Indexes i where rows i, i+1 and i+2 share a game and have the three columns respectively.
+
+        Rows are taken in (gameID, paID) order, or in paID order (through
+        self.chronological) when chronological is true.
+        """
+        rows = self.chronological if chronological else slice(None)
+        game = self.game[rows]
+        same_game = game[:-1] == game[1:]
+        mask = (same_game[:-1] & same_game[1:] & getattr(self, f'has_{first}')[rows][:-2]
+                & getattr(self, f'has_{second}')[rows][1:-1] & getattr(self, f'has_{third}')[rows][2:])
+        return np.flatnonzero(mask)
+
+    def sequences(self, first, second, third, chronological=False):
+        """(first, second, third) values of every triples() match, as tuples of ints"""
+        rows = self.chronological if chronological else slice(None)
+        i = self.triples(first, second, third, chronological)
+        return list(zip(getattr(self, first)[rows][i].tolist(), getattr(self, second)[rows][i + 1].tolist(),
+                        getattr(self, third)[rows][i + 2].tolist()))
+
+def read_player_columns(player_id, role, **filters):
+    """PAColumns for a player's 'batting' or 'pitching' PAs, straight from the database.
+
+    Only the five analysis columns are read, from the covering index. filters
+    are passed on to query_plate_appearances (seasons, game_ids, situation).
+    """
+    rows = query_plate_appearances(player_id, role, ANALYSIS_COLUMNS, **filters)
+    if not rows:
+        return PAColumns([], [], [], [], [])
+    return PAColumns(*zip(*rows))
+
+class PAColumnsCache:
+    """An LRU of PAColumns keyed by (player ID, role), bounded by total array size.
+
+    Each entry remembers the player's data version (getData.get_player_data_version)
+    from when it was loaded. Rather than query that on every lookup, the cache
+    watches SQLite's PRAGMA data_version on a connection of its own, which
+    changes whenever any other connection (an ingest in this process or
+    another) commits. Until it does, entries are served without touching the
+    database; after it does, each entry is rechecked against its player's
+    version once and reloaded only if that player's PAs changed.
+    """
+    def __init__(self, max_bytes=PA_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (player_id, role) -> [columns, version, generation]
+        self.size = 0
+        self.generation = 0
+        self.watch_conn = None
+        self.watch_path = None
+        self.seen_data_version = None
+        self.hits = 0
+        self.misses = 0
+
+    def _current_generation(self):
+        # Called with the lock held
+        path = os.path.abspath(db.DB_PATH)
+        if path != self.watch_path:
+            # A different database file: nothing cached so far applies to it
+            if self.watch_conn is not None:
+                self.watch_conn.close()
+            self.watch_conn = db.connect(path, readonly=True)
+            self.watch_path = path
+            self.entries.clear()
+            self.size = 0
+            self.seen_data_version = None
+        data_version = self.watch_conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self.seen_data_version:
+            self.seen_data_version = data_version
+            self.generation += 1
+        return self.generation
+
+    def get(self, player_id, role):
+        key = (player_id, role)
+        with self.lock:
+            generation = self._current_generation()
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] == generation:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        
+        # Something was written since this entry was checked: see whether it was this player
+        version = player_data_version(player_id)
+        if entry is not None and entry[1] == version:
+            with self.lock:
+                entry[2] = generation
+                self.hits += 1
+            return entry[0]
+        
+        columns = read_player_columns(player_id, role)
+        with self.lock:
+            self.misses += 1
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[0].nbytes
+            self.entries[key] = [columns, version, generation]
+            self.size += columns.nbytes
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, (evicted, _, _) = self.entries.popitem(last=False)
+                self.size -= evicted.nbytes
+        return columns
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {'players': len(self.entries), 'bytes': self.size,
+                    'hits': self.hits, 'misses': self.misses}
+
+_cache = PAColumnsCache()
+
+def load_player_columns(player_id, role, **filters):
+    """PAColumns for a player's 'batting' or 'pitching' PAs, from this process's cache when current.
+
+    Filtered loads (see read_player_columns) always go to the database.
+    """
+    if filters:
+        return read_player_columns(player_id, role, **filters)
+    return _cache.get(player_id, role)
+
+def number_buckets(values):
+    """Bucket 0-9 of pitches or swings: 1-100, 101-200, ..., 901-1000"""
+    return np.clip((values - 1) // 100, 0, 9)
+
+def diff_buckets(diffs):
+    """Bucket 0-9 of diffs: 0-49, 50-99, ..., 450 and up"""
+    return np.clip(diffs // 50, 0, 9)
+
+def delta_buckets(deltas):
+    """Bucket 0-9 of deltas: -499 to -400, ..., 401 to 500"""
+    return np.clip((deltas + 499) // 100, 0, 9)
+
+def number_distribution(values, buckets):
+    """{bucket: percentage} of pitches or swings over buckets of 100 starting at 0, or {} if empty"""
+    if len(values) == 0:
+        return {}
+    counts = np.bincount(number_buckets(values), minlength=len(buckets))
+    return dict(zip(buckets, (counts / len(values) * 100).tolist()))
+
+def delta_distribution(deltas, buckets):
+    """{bucket: percentage} over 50-wide delta buckets from -450, with 451 holding 451-500"""
+    if len(deltas) == 0:
+        return {}
+    indexes = np.where(deltas > 450, len(buckets) - 1, np.clip(deltas // 50, -9, 9) + 9)
+    counts = np.bincount(indexes, minlength=len(buckets))
+    return dict(zip(buckets, (counts / len(deltas) * 100).tolist()))
+
+def transition_matrix(rows, cols):
+    """10x10 matrix of row bucket to column bucket transitions, as percentages of each row"""
+    matrix = np.bincount(rows * 10 + cols, minlength=100).reshape(10, 10).astype(float)
+    row_sums = matrix.sum(axis=1, keepdims=True)
+    row_sums[row_sums == 0] = 1  # Avoid division by zero
+    return (matrix / row_sums) * 100
@@ -1,115 +1,47 @@
-import sqlite3
 from collections import defaultdict
 import matplotlib.pyplot as plt
-import numpy as np
-from search_player import get_player_pitching_pas_by_id, get_player_by_id
-from helpers import get_result_color, calculate_delta
+from search_player import get_player_pitching_pas_by_id, get_player_by_id, query_plate_appearances
+from helpers import get_result_color
+from pa_columns import load_player_columns
+from player_profile import get_player_profile, VALUE_BUCKETS, DELTA_BUCKETS
+from chart_templates import BarFigure, BarPanel, MatrixFigure, MatrixPanel
 import statistics
 
 def get_pitch_distribution(player_id):
     """Returns distribution of pitches in 100-number buckets"""
-    pas = get_player_pitching_pas_by_id(player_id)
-    buckets = defaultdict(int)
-    
-    # Initialize all buckets from 1-1000 in steps of 100
-    for i in range(0, 1000, 100):
-        buckets[i] = 0
-    
-    for pa in pas:
-        if pa.pitch is not None:
-            bucket = ((pa.pitch - 1) // 100) * 100
-            bucket = max(0, min(900, bucket))
-            buckets[bucket] += 1
-    
-    total = sum(buckets.values())
-    if total == 0:
-        return {}
-    
-    return {bucket: (count/total)*100 for bucket, count in sorted(buckets.items())}
+    return dict(get_player_profile(player_id, 'pitching').distribution)
 
 def get_delta_history(player_id):
     """Returns chronological list of deltas between consecutive pitches"""
-    pas = get_player_pitching_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: x.paID)
-    
-    deltas = []
-    for i in range(len(sorted_pas)-1):
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        if pa1.pitch is not None and pa2.pitch is not None:
-            delta = calculate_delta(pa1.pitch, pa2.pitch)
-            deltas.append(delta)
-    
-    return deltas
+    return list(get_player_profile(player_id, 'pitching').delta_history)
 
 def get_delta_distribution(player_id):
     """Returns distribution of deltas in 50-number buckets from -450 to 500"""
-    deltas = get_delta_history(player_id)
-    buckets = defaultdict(int)
-    
-    # Initialize buckets from -450 to 450 in steps of 50, plus special 451-500 bucket
-    for i in range(-450, 451, 50):
-        buckets[i] = 0
-    buckets[451] = 0  # Special bucket for 451-500
-    
-    for delta in deltas:
-        if delta > 450:
-            # Special case for 451-500
-            buckets[451] += 1
-        else:
-            # Round to nearest 50
-            bucket = (delta // 50) * 50
-            # Clamp to our range
-            bucket = max(-450, min(450, bucket))
-            buckets[bucket] += 1
-    
-    total = sum(buckets.values())
-    if total == 0:
-        return {}
-    
-    return {bucket: (count/total)*100 for bucket, count in sorted(buckets.items())}
+    return dict(get_player_profile(player_id, 'pitching').delta_distribution)
+
+# Buckets and labels shared by the chart layouts below
+PITCH_BUCKETS = VALUE_BUCKETS['pitching']
+DIFF_RANGES = [f'{i*50}-{(i+1)*50-1}' for i in range(10)]
+PITCH_RANGES = [f'{i*100+1}-{(i+1)*100}' for i in range(10)]
+DELTA_RANGES = [f'{-499+i*100}-{-400+i*100}' for i in range(10)]
 
-def plot_distributions(player_id):
+DISTRIBUTION_PANELS = [
+    BarPanel('Pitch Distribution', 'Pitch Range', 'Percentage', PITCH_BUCKETS,
+             [f'{b+1}-{b+100}' for b in PITCH_BUCKETS], 80, False),
+    BarPanel('Delta Distribution', 'Delta Range', 'Percentage', DELTA_BUCKETS,
+             [f'{b} to {b+49}' if b != 451 else '451 to 500' for b in DELTA_BUCKETS], 40, True),
+]
+
+def plot_distributions(player_id, figure=None):
+    """Draw pitch and delta distributions into figure (a new BarFigure by default). Returns the Figure"""
     player = get_player_by_id(player_id)
     if not player:
         return None
     
-    # Create figure with two subplots
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 12))
-    fig.suptitle(f'Pitching Distributions for {player.playerName}')
-    
-    # Get distributions
-    dist = get_pitch_distribution(player_id)
-    delta_dist = get_delta_distribution(player_id)
-    
-    # Plot pitch distribution
-    buckets = list(dist.keys())
-    percentages = list(dist.values())
-    ax1.bar(buckets, percentages, width=80)
-    ax1.set_title('Pitch Distribution')
-    ax1.set_xlabel('Pitch Range')
-    ax1.set_ylabel('Percentage')
-    ax1.set_xticks(buckets)
-    ax1.set_xticklabels([f'{b+1}-{b+100}' for b in buckets], rotation=45)
-    
-    # Plot delta distribution
-    buckets = list(delta_dist.keys())
-    percentages = list(delta_dist.values())
-    ax2.bar(buckets, percentages, width=40)
-    ax2.set_title('Delta Distribution')
-    ax2.set_xlabel('Delta Range')
-    ax2.set_ylabel('Percentage')
-    ax2.set_xticks(buckets)
-    ax2.set_xticklabels([
-        f'{b} to {b+49}' if b != 451 else '451 to 500'
-        for b in buckets
-    ], rotation=45)
-    
-    # Add gridlines for better readability
-    ax2.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    return fig
+    figure = figure or BarFigure(DISTRIBUTION_PANELS)
+    profile = get_player_profile(player_id, 'pitching')
+    distributions = [profile.distribution, profile.delta_distribution]
+    return figure.update(f'Pitching Distributions for {player.playerName}', distributions).fig
 
 def plot_game_sequences_overlay(player_id, num_games=5):
     """Plot pitch sequences for the last N games overlaid on one plot"""
@@ -117,7 +49,7 @@ def plot_game_sequences_overlay(player_id, num_games=5):
     if not player:
         return None
     
-    pas = get_player_pitching_pas_by_id(player_id)
+    pas = query_plate_appearances(player_id, 'pitching')
     
     # Group PAs by game
     games = defaultdict(list)
@@ -205,254 +137,57 @@ def print_game_sequences(player_id, num_games=5):
 
 def get_diff_pitch_distribution(player_id):
     """Returns distribution of pitches following specific diffs"""
-    pas = get_player_pitching_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: (x.gameID, x.paID))
-    
-    # Create a 10x10 matrix for ranges
-    matrix = np.zeros((10, 10))
-    
-    for i in range(len(sorted_pas)-1):
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        
-        # Only consider consecutive PAs in same game
-        if (pa1.gameID == pa2.gameID and 
-            pa1.diff is not None and pa2.pitch is not None):
-            
-            # Get diff bucket (previous diff, 0-500 in steps of 50)
-            diff_bucket = (pa1.diff // 50)
-            diff_bucket = max(0, min(9, diff_bucket))
-            
-            # Get pitch bucket
-            pitch_bucket = ((pa2.pitch - 1) // 100)
-            pitch_bucket = max(0, min(9, pitch_bucket))
-            
-            matrix[diff_bucket][pitch_bucket] += 1
-    
-    # Convert to percentages by row
-    row_sums = matrix.sum(axis=1, keepdims=True)
-    row_sums[row_sums == 0] = 1  # Avoid division by zero
-    matrix = (matrix / row_sums) * 100
-    
-    return matrix
+    return get_player_profile(player_id, 'pitching').diff_value_matrix.copy()
 
 def get_pitch_pitch_distribution(player_id):
     """Returns distribution of pitches following specific pitches"""
-    pas = get_player_pitching_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: (x.gameID, x.paID))
-    
-    # Create a 10x10 matrix for ranges
-    matrix = np.zeros((10, 10))
-    
-    for i in range(len(sorted_pas)-1):
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        
-        # Only consider consecutive PAs in same game
-        if (pa1.gameID == pa2.gameID and 
-            pa1.pitch is not None and pa2.pitch is not None):
-            
-            # Get pitch buckets
-            prev_bucket = ((pa1.pitch - 1) // 100)
-            next_bucket = ((pa2.pitch - 1) // 100)
-            prev_bucket = max(0, min(9, prev_bucket))
-            next_bucket = max(0, min(9, next_bucket))
-            
-            matrix[prev_bucket][next_bucket] += 1
-    
-    # Convert to percentages by row
-    row_sums = matrix.sum(axis=1, keepdims=True)
-    row_sums[row_sums == 0] = 1  # Avoid division by zero
-    matrix = (matrix / row_sums) * 100
-    
-    return matrix
+    return get_player_profile(player_id, 'pitching').value_value_matrix.copy()
 
 def get_delta_delta_distribution(player_id):
     """Returns distribution of deltas following specific deltas"""
-    pas = get_player_pitching_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: (x.gameID, x.paID))
-    
-    # Create a 10x10 matrix for ranges
-    matrix = np.zeros((10, 10))
-    
-    for i in range(len(sorted_pas)-2):  # Need 3 PAs to get two consecutive deltas
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        pa3 = sorted_pas[i+2]
-        
-        # Only consider consecutive PAs in same game
-        if (pa1.gameID == pa2.gameID == pa3.gameID and 
-            pa1.pitch is not None and pa2.pitch is not None and pa3.pitch is not None):
-            
-            # Calculate deltas
-            delta1 = calculate_delta(pa1.pitch, pa2.pitch)
-            delta2 = calculate_delta(pa2.pitch, pa3.pitch)
-            
-            # Get delta buckets
-            prev_bucket = ((delta1 + 499) // 100)
-            next_bucket = ((delta2 + 499) // 100)
-            prev_bucket = max(0, min(9, prev_bucket))
-            next_bucket = max(0, min(9, next_bucket))
-            
-            matrix[prev_bucket][next_bucket] += 1
-    
-    # Convert to percentages by row
-    row_sums = matrix.sum(axis=1, keepdims=True)
-    row_sums[row_sums == 0] = 1  # Avoid division by zero
-    matrix = (matrix / row_sums) * 100
-    
-    return matrix
+    return get_player_profile(player_id, 'pitching').delta_delta_matrix.copy()
 
 def get_diff_delta_distribution(player_id):
     """Returns distribution of deltas following specific diffs"""
-    pas = get_player_pitching_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: (x.gameID, x.paID))
-    
-    # Create a 10x10 matrix for ranges
-    matrix = np.zeros((10, 10))
-    
-    for i in range(len(sorted_pas)-2):  # Need 3 PAs to get delta after diff
-        pa1 = sorted_pas[i]
-        pa2 = sorted_pas[i+1]
-        pa3 = sorted_pas[i+2]
-        
-        # Only consider consecutive PAs in same game
-        if (pa1.gameID == pa2.gameID == pa3.gameID and 
-            pa1.diff is not None and pa2.pitch is not None and pa3.pitch is not None):
-            
-            # Get diff bucket (0-500 in steps of 50)
-            diff_bucket = (pa1.diff // 50)
-            diff_bucket = max(0, min(9, diff_bucket))
-            
-            # Calculate and bucket the delta
-            delta = calculate_delta(pa2.pitch, pa3.pitch)
-            delta_bucket = ((delta + 499) // 100)
-            delta_bucket = max(0, min(9, delta_bucket))
-            
-            matrix[diff_bucket][delta_bucket] += 1
-    
-    # Convert to percentages by row
-    row_sums = matrix.sum(axis=1, keepdims=True)
-    row_sums[row_sums == 0] = 1  # Avoid division by zero
-    matrix = (matrix / row_sums) * 100
-    
-    return matrix
+    return get_player_profile(player_id, 'pitching').diff_delta_matrix.copy()
+
+MATRIX_PANELS = [
+    MatrixPanel('Previous Diff to Next Pitch', 'Next Pitch Range', 'Previous Diff Range', PITCH_RANGES, DIFF_RANGES),
+    MatrixPanel('Previous Pitch to Next Pitch', 'Next Pitch Range', 'Previous Pitch Range', PITCH_RANGES, PITCH_RANGES),
+    MatrixPanel('Previous Delta to Next Delta', 'Next Delta Range', 'Previous Delta Range', DELTA_RANGES, DELTA_RANGES),
+    MatrixPanel('Previous Diff to Next Delta', 'Next Delta Range', 'Previous Diff Range', DELTA_RANGES, DIFF_RANGES),
+]
 
-def plot_matrices(player_id):
+def get_matrices(player_id):
+    """The four pattern matrices, in MATRIX_PANELS order"""
+    profile = get_player_profile(player_id, 'pitching')
+    return [
+        profile.diff_value_matrix.copy(),
+        profile.value_value_matrix.copy(),
+        profile.delta_delta_matrix.copy(),
+        profile.diff_delta_matrix.copy(),
+    ]
+
+def plot_matrices(player_id, figure=None):
+    """Draw the pattern matrices into figure (a new MatrixFigure by default). Returns the Figure"""
     player = get_player_by_id(player_id)
     if not player:
         return None
-        
-    # Create figure with 2x2 subplots
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(20, 16))
-    fig.suptitle(f'Pattern Analysis for {player.playerName}')
-    
-    # Diff to Next Pitch
-    matrix = get_diff_pitch_distribution(player_id)
-    im1 = ax1.imshow(matrix, cmap='YlOrRd')
-    ax1.set_title('Previous Diff to Next Pitch')
-    ax1.set_xlabel('Next Pitch Range')
-    ax1.set_ylabel('Previous Diff Range')
-    
-    # Add numbers to cells
-    for i in range(10):
-        for j in range(10):
-            ax1.text(j, i, f'{matrix[i, j]:.0f}', ha='center', va='center')
-    
-    # Labels
-    diff_ranges = [f'{i*50}-{(i+1)*50-1}' for i in range(10)]
-    pitch_ranges = [f'{i*100+1}-{(i+1)*100}' for i in range(10)]
-    ax1.set_xticks(range(10))
-    ax1.set_yticks(range(10))
-    ax1.set_xticklabels(pitch_ranges, rotation=45, ha='right')
-    ax1.set_yticklabels(diff_ranges)
-    
-    # Pitch to Next Pitch
-    matrix = get_pitch_pitch_distribution(player_id)
-    im2 = ax2.imshow(matrix, cmap='YlOrRd')
-    ax2.set_title('Previous Pitch to Next Pitch')
-    ax2.set_xlabel('Next Pitch Range')
-    ax2.set_ylabel('Previous Pitch Range')
-    
-    # Add numbers to cells
-    for i in range(10):
-        for j in range(10):
-            ax2.text(j, i, f'{matrix[i, j]:.0f}', ha='center', va='center')
-    
-    ax2.set_xticks(range(10))
-    ax2.set_yticks(range(10))
-    ax2.set_xticklabels(pitch_ranges, rotation=45, ha='right')
-    ax2.set_yticklabels(pitch_ranges)
-    
-    # Delta to Delta
-    matrix = get_delta_delta_distribution(player_id)
-    im3 = ax3.imshow(matrix, cmap='YlOrRd')
-    ax3.set_title('Previous Delta to Next Delta')
-    ax3.set_xlabel('Next Delta Range')
-    ax3.set_ylabel('Previous Delta Range')
-    
-    # Add numbers to cells
-    for i in range(10):
-        for j in range(10):
-            ax3.text(j, i, f'{matrix[i, j]:.0f}', ha='center', va='center')
-    
-    delta_ranges = [f'{-499+i*100}-{-400+i*100}' for i in range(10)]
-    ax3.set_xticks(range(10))
-    ax3.set_yticks(range(10))
-    ax3.set_xticklabels(delta_ranges, rotation=45, ha='right')
-    ax3.set_yticklabels(delta_ranges)
-    
-    # Diff to Next Delta
-    matrix = get_diff_delta_distribution(player_id)
-    im4 = ax4.imshow(matrix, cmap='YlOrRd')
-    ax4.set_title('Previous Diff to Next Delta')
-    ax4.set_xlabel('Next Delta Range')
-    ax4.set_ylabel('Previous Diff Range')
-    
-    # Add numbers to cells
-    for i in range(10):
-        for j in range(10):
-            ax4.text(j, i, f'{matrix[i, j]:.0f}', ha='center', va='center')
-    
-    ax4.set_xticks(range(10))
-    ax4.set_yticks(range(10))
-    ax4.set_xticklabels(delta_ranges, rotation=45, ha='right')
-    ax4.set_yticklabels(diff_ranges)
-    
-    # Add colorbars
-    plt.colorbar(im1, ax=ax1, label='Percentage')
-    plt.colorbar(im2, ax=ax2, label='Percentage')
-    plt.colorbar(im3, ax=ax3, label='Percentage')
-    plt.colorbar(im4, ax=ax4, label='Percentage')
     
-    plt.tight_layout()
-    return fig
+    figure = figure or MatrixFigure(MATRIX_PANELS)
+    return figure.update(f'Pattern Analysis for {player.playerName}', get_matrices(player_id)).fig
 
 def get_first_pitches(player_id):
     """Returns list of first pitches in each game"""
-    pas = get_player_pitching_pas_by_id(player_id)
-    games = defaultdict(list)
-    
-    # Group PAs by game
-    for pa in pas:
-        if pa.gameID and pa.pitch:
-            games[pa.gameID].append(pa)
-    
-    # Get first PA from each game
-    first_pitches = []
-    for game_pas in games.values():
-        sorted_game_pas = sorted(game_pas, key=lambda x: x.paID)
-        if sorted_game_pas:
-            first_pitches.append(sorted_game_pas[0].pitch)
-    
-    return first_pitches
+    return list(get_player_profile(player_id, 'pitching').first_values)
 
 def plot_first_pitch_trends(player_id):
     player = get_player_by_id(player_id)
     if not player:
         return None
     
-    first_pitches = get_first_pitches(player_id)
+    profile = get_player_profile(player_id, 'pitching')
+    first_pitches = profile.first_values
     if not first_pitches:
         return None
     
@@ -461,25 +196,13 @@ def plot_first_pitch_trends(player_id):
     fig.suptitle(f'First Pitch Analysis for {player.playerName}')
     
     # Distribution plot
-    buckets = defaultdict(int)
-    for i in range(0, 1000, 100):
-        buckets[i] = 0
-    
-    for pitch in first_pitches:
-        bucket = ((pitch - 1) // 100) * 100
-        bucket = max(0, min(900, bucket))
-        buckets[bucket] += 1
-    
-    total = sum(buckets.values())
-    if total > 0:
-        percentages = {b: (c/total)*100 for b, c in buckets.items()}
-        
-        ax1.bar(list(percentages.keys()), list(percentages.values()), width=80)
-        ax1.set_title('First Pitch Distribution')
-        ax1.set_xlabel('Pitch Range')
-        ax1.set_ylabel('Percentage')
-        ax1.set_xticks(list(percentages.keys()))
-        ax1.set_xticklabels([f'{b+1}-{b+100}' for b in percentages.keys()], rotation=45)
+    percentages = profile.first_distribution
+    ax1.bar(list(percentages.keys()), list(percentages.values()), width=80)
+    ax1.set_title('First Pitch Distribution')
+    ax1.set_xlabel('Pitch Range')
+    ax1.set_ylabel('Percentage')
+    ax1.set_xticks(list(percentages.keys()))
+    ax1.set_xticklabels([f'{b+1}-{b+100}' for b in percentages.keys()], rotation=45)
     
     # History plot
     indices = range(len(first_pitches))
@@ -504,37 +227,28 @@ def print_first_pitch_stats(player_id):
     if not player:
         return
     
-    first_pitches = get_first_pitches(player_id)
-    if not first_pitches:
+    profile = get_player_profile(player_id, 'pitching')
+    stats = profile.first_value_stats()
+    if not stats:
         return
     
+    bucket = stats['most_common_bucket']
     print(f"\nFirst Pitch Analysis for {player.playerName}")
-    print(f"Number of games: {len(first_pitches)}")
-    print(f"Average first pitch: {sum(first_pitches)/len(first_pitches):.1f}")
-    print(f"Most common range: {((max(set(first_pitches), key=first_pitches.count)-1)//100)*100+1}-{((max(set(first_pitches), key=first_pitches.count)-1)//100)*100+100}")
+    print(f"Number of games: {stats['games']}")
+    print(f"Average first pitch: {stats['average']:.1f}")
+    print(f"Most common range: {bucket+1}-{bucket+100}")
     
     print("\nLast 5 first pitches:")
-    for i, pitch in enumerate(first_pitches[-5:], 1):
+    for i, pitch in enumerate(profile.first_values[-5:], 1):
         print(f"{i}. {pitch}")
 
 def predict_next_pitch(player_id, prev_pitch=None, prev_diff=None):
     """Predict next pitch based on previous patterns using sliding windows"""
-    pas = get_player_pitching_pas_by_id(player_id)
-    sorted_pas = sorted(pas, key=lambda x: (x.gameID, x.paID))
+    columns = load_player_columns(player_id, 'pitching')
     
-    # Get sequences of 3 consecutive pitches
-    pitch_sequences = []
-    diff_sequences = []
-    
-    for i in range(len(sorted_pas)-2):
-        pa1, pa2, pa3 = sorted_pas[i:i+3]
-        
-        # Only consider consecutive PAs in same game
-        if (pa1.gameID == pa2.gameID == pa3.gameID):
-            if all(pa.pitch is not None for pa in [pa1, pa2, pa3]):
-                pitch_sequences.append((pa1.pitch, pa2.pitch, pa3.pitch))
-            if pa1.diff is not None and all(pa.pitch is not None for pa in [pa2, pa3]):
-                diff_sequences.append((pa1.diff, pa2.pitch, pa3.pitch))
+    # Sequences of 3 consecutive PAs in the same game
+    pitch_sequences = columns.sequences('pitch', 'pitch', 'pitch')
+    diff_sequences = columns.sequences('diff', 'pitch', 'pitch')
     
     if not pitch_sequences and not diff_sequences:
         return None, 0, 0  # No data to predict from
@@ -571,10 +285,7 @@ def predict_next_pitch(player_id, prev_pitch=None, prev_diff=None):
     
     if total_weight == 0:
         # If no weights, use overall distribution with recency weighting
-        all_sequences = [(pa1.pitch, pa2.pitch, pa3.pitch) 
-                        for pa1, pa2, pa3 in zip(sorted_pas[:-2], sorted_pas[1:-1], sorted_pas[2:])
-                        if pa1.gameID == pa2.gameID == pa3.gameID 
-                        and all(pa.pitch is not None for pa in [pa1, pa2, pa3])]
+        all_sequences = pitch_sequences
         
         if not all_sequences:
             return None, 0, 0
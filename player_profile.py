@@ -0,0 +1,98 @@
+import weakref
+import numpy as np
+from helpers import calculate_deltas
+from pa_columns import (load_player_columns, number_buckets, diff_buckets, delta_buckets,
+                        number_distribution, delta_distribution, transition_matrix)
+
+# The number a player picks in each role
+ROLE_VALUES = {'batting': 'swing', 'pitching': 'pitch'}
+
+# Distribution buckets of 100 by role. Batting charts have always carried an
+# extra, always empty 1001+ bucket, kept so they look the same.
+VALUE_BUCKETS = {
+    'batting': list(range(0, 1001, 100)),
+    'pitching': list(range(0, 1000, 100)),
+}
+DELTA_BUCKETS = list(range(-450, 451, 50)) + [451]
+
+class PlayerProfile:
+    """Every distribution, matrix and first-number stat for one player in one role.
+
+    Built in one pass over the player's PAColumns: values, diffs and the
+    deltas between neighbouring PAs are bucketed once, and every histogram
+    and transition matrix is a bincount over those shared buckets.
+
+    distribution: {bucket: percentage} of the player's numbers
+    delta_history: deltas between consecutive numbers, in paID order
+    delta_distribution: {bucket: percentage} of delta_history
+    diff_value_matrix, value_value_matrix, delta_delta_matrix, diff_delta_matrix:
+        10x10 transition matrices between consecutive PAs in the same game
+    first_values: the first number of each game, in the order the query first
+        returns a PA of that game (newest session first)
+    first_distribution: {bucket: percentage} of first_values
+    """
+    def __init__(self, columns, role):
+        name = ROLE_VALUES[role]
+        buckets = VALUE_BUCKETS[role]
+        value = getattr(columns, name)
+        has_value = getattr(columns, f'has_{name}')
+
+        self.distribution = number_distribution(value[has_value], buckets)
+        deltas = columns.deltas(name)
+        self.delta_history = deltas.tolist()
+        self.delta_distribution = delta_distribution(deltas, DELTA_BUCKETS)
+
+        # Neighbouring PAs: pair i is PA i followed by PA i+1
+        value_bucket = number_buckets(value)
+        diff_bucket = diff_buckets(columns.diff)
+        both = columns.same_game & has_value[:-1] & has_value[1:]
+        after_diff = columns.same_game & columns.has_diff[:-1] & has_value[1:]
+        # Delta of every pair, meaningful where both holds
+        delta_bucket = delta_buckets(calculate_deltas(value[:-1], value[1:]))
+
+        self.diff_value_matrix = transition_matrix(diff_bucket[:-1][after_diff],
+                                                   value_bucket[1:][after_diff])
+        self.value_value_matrix = transition_matrix(value_bucket[:-1][both], value_bucket[1:][both])
+        # Two pairs in a row share their middle PA
+        deltas_in_a_row = both[:-1] & both[1:]
+        self.delta_delta_matrix = transition_matrix(delta_bucket[:-1][deltas_in_a_row],
+                                                    delta_bucket[1:][deltas_in_a_row])
+        diff_then_delta = columns.has_diff[:-2] & columns.same_game[:-1] & both[1:]
+        self.diff_delta_matrix = transition_matrix(diff_bucket[:-2][diff_then_delta],
+                                                   delta_bucket[1:][diff_then_delta])
+
+        # First non-zero number of each game with a gameID. Rows are sorted by
+        # (game, paID), so that is the first eligible row of each game.
+        eligible = np.flatnonzero(columns.has_game & has_value & (value != 0))
+        games = columns.game[eligible]
+        starts = np.flatnonzero(np.r_[True, games[1:] != games[:-1]]) if len(eligible) else eligible
+        firsts = eligible[starts]
+        if len(firsts):
+            # Games in the order the query first returned one of their eligible PAs
+            seen = np.minimum.reduceat(columns.fetched[eligible], starts)
+            firsts = firsts[np.argsort(seen, kind='stable')]
+        self.first_values = value[firsts].tolist()
+        self.first_distribution = number_distribution(value[firsts], buckets)
+
+    def first_value_stats(self):
+        """Games, average first number and the bucket of the most common first number, or None"""
+        values = self.first_values
+        if not values:
+            return None
+        most_common = max(set(values), key=values.count)
+        return {
+            'games': len(values),
+            'average': sum(values) / len(values),
+            'most_common_bucket': ((most_common - 1) // 100) * 100,
+        }
+
+# Profiles live as long as the cached PAColumns they were built from
+_profiles = weakref.WeakKeyDictionary()
+
+def get_player_profile(player_id, role):
+    """The PlayerProfile for a player's 'batting' or 'pitching' PAs, computed once per load of their data"""
+    columns = load_player_columns(player_id, role)
+    profile = _profiles.get(columns)
+    if profile is None:
+        profile = _profiles[columns] = PlayerProfile(columns, role)
+    return profile
@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import threading
+import time
+import db
+import getData
+
+# Lower refreshes first
+PRIORITY_QUERIED = 0   # someone looked the player up recently
+PRIORITY_UPCOMING = 1  # played in the league's latest session, so likely in the next games
+PRIORITY_ROSTER = 2    # anyone else on an active roster
+
+DEFAULT_BUDGET = 240           # API requests per budget period
+DEFAULT_BUDGET_PERIOD = 3600   # seconds
+REQUESTS_PER_REFRESH = 2       # a batting and a pitching feed
+DEFAULT_MIN_AGE = 15 * 60      # seconds a refreshed player is left alone
+QUERIED_WINDOW = 6 * 3600      # how long a lookup keeps a player at the front
+ACTIVE_STATUS = 1
+
+class RefreshScheduler:
+    """Trickle-refreshes players in the background, most wanted first.
+
+    Players are queued by priority (recent lookups, then players from the
+    latest session, then the rest of the active rosters) and, within a
+    priority, stalest first. Refreshes draw from a token bucket of API
+    requests, so the background work never exceeds the configured budget
+    however long the queue is.
+    """
+    def __init__(self, budget=DEFAULT_BUDGET, budget_period=DEFAULT_BUDGET_PERIOD,
+                 min_age=DEFAULT_MIN_AGE, refresh=None):
+        self.budget = budget
+        self.refill_rate = budget / budget_period
+        self.tokens = float(budget)
+        self.refilled_at = time.monotonic()
+        self.min_age = min_age
+        self.refresh = refresh or getData.refresh_player
+        self.lock = threading.Lock()
+        self.heap = []
+        self.queued = {}  # player_id -> best priority currently in the heap
+        self.queried = {}  # player_id -> time.time() of the last lookup
+        self.counter = itertools.count()
+        self.refreshed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def touch(self, player_id):
+        """Note a lookup, moving the player to the front of the queue"""
+        with self.lock:
+            self.queried[player_id] = time.time()
+            self._push(player_id, PRIORITY_QUERIED, 0)
+
+    def plan(self):
+        """Rebuild the queue from recent lookups, the latest session and the active rosters"""
+        now = time.time()
+        with db.reader() as conn:
+            last_synced = get_last_synced(conn)
+            upcoming = get_upcoming_players(conn)
+            roster = get_active_roster(conn)
+        with self.lock:
+            self.queried = {player_id: at for player_id, at in self.queried.items()
+                            if now - at < QUERIED_WINDOW}
+            self.heap = []
+            self.queued = {}
+            for player_ids, priority in ((self.queried, PRIORITY_QUERIED),
+                                         (upcoming, PRIORITY_UPCOMING),
+                                         (roster, PRIORITY_ROSTER)):
+                for player_id in player_ids:
+                    self._push(player_id, priority, last_synced.get(player_id, 0))
+            return len(self.queued)
+
+    def _push(self, player_id, priority, last_synced):
+        if self.queued.get(player_id, priority + 1) <= priority:
+            return
+        self.queued[player_id] = priority
+        heapq.heappush(self.heap, (priority, last_synced, next(self.counter), player_id))
+
+    def _pop(self):
+        with self.lock:
+            while self.heap:
+                priority, _, _, player_id = heapq.heappop(self.heap)
+                # Entries superseded by a higher priority push are dropped lazily
+                if self.queued.get(player_id) == priority:
+                    del self.queued[player_id]
+                    return priority, player_id
+            return None, None
+
+    def _take_tokens(self, count):
+        now = time.monotonic()
+        self.tokens = min(self.budget, self.tokens + (now - self.refilled_at) * self.refill_rate)
+        self.refilled_at = now
+        if self.tokens < count:
+            return False
+        self.tokens -= count
+        return True
+
+    def run_pending(self, max_refreshes=None):
+        """Refresh queued players until the queue or the request budget runs out.
+
+        Players refreshed within min_age seconds (by anyone) are skipped for
+        free. Blocking; returns the number of players refreshed.
+        """
+        done = 0
+        while max_refreshes is None or done < max_refreshes:
+            priority, player_id = self._pop()
+            if player_id is None:
+                break
+            with db.reader() as conn:
+                age = getData.get_player_refresh_age(player_id, conn)
+            if age is not None and age < self.min_age:
+                self.skipped += 1
+                continue
+            if not self._take_tokens(REQUESTS_PER_REFRESH):
+                # Out of budget: put the player back for the next round
+                with self.lock:
+                    self._push(player_id, priority, 0)
+                break
+            try:
+                self.refresh(player_id)
+                self.refreshed += 1
+                done += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error refreshing player {player_id}: {str(e)}")
+        return done
+
+    def stats(self):
+        with self.lock:
+            return {'queued': len(self.queued), 'refreshed': self.refreshed,
+                    'skipped': self.skipped, 'failed': self.failed,
+                    'tokens': int(self.tokens)}
+
+def get_last_synced(conn):
+    """Unix time each player was last synced, taking the older of their two feeds"""
+    c = conn.cursor()
+    c.execute("SELECT playerID, MIN(strftime('%s', last_synced)) FROM sync_state GROUP BY playerID")
+    return {player_id: int(synced or 0) for player_id, synced in c.fetchall()}
+
+def get_upcoming_players(conn):
+    """Players whose newest PA is in the league's latest session.
+
+    The API has no schedule, so whoever just played stands in for whoever is
+    about to.
+    """
+    c = conn.cursor()
+    c.execute('SELECT season, session FROM sync_state ORDER BY season DESC, session DESC LIMIT 1')
+    latest = c.fetchone()
+    if latest is None:
+        return []
+    c.execute('SELECT DISTINCT playerID FROM sync_state WHERE season = ? AND session = ?', latest)
+    return [row[0] for row in c.fetchall()]
+
+def get_active_roster(conn):
+    c = conn.cursor()
+    c.execute("SELECT playerID FROM players WHERE status = ? AND team IS NOT NULL AND team != ''",
+              (ACTIVE_STATUS,))
+    return [row[0] for row in c.fetchall()]
@@ -1,27 +1,24 @@
-import sqlite3
 from tabulate import tabulate
-from models import Player, PlateAppearance
+from collections import namedtuple
+from models import PLAYER_FIELDS, PA_FIELDS, player_row_factory, plate_appearance_row_factory
+import db
 
 def search_player():
     name = input("Enter player name to search: ").strip()
     
-    # Connect to database and search for players
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    
     # Search for players with similar names using LIKE
-    c.execute('''
-        SELECT playerID, playerName, team 
-        FROM players 
-        WHERE playerName LIKE ? 
-        LIMIT 5
-    ''', (f'%{name}%',))
-    
-    players = c.fetchall()
+    with db.reader() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT playerID, playerName, team 
+            FROM players 
+            WHERE playerName LIKE ? 
+            LIMIT 5
+        ''', (f'%{name}%',))
+        players = c.fetchall()
     
     if not players:
         print("No players found with that name.")
-        conn.close()
         return None
     
     # Display players with numbers for selection
@@ -34,7 +31,6 @@ def search_player():
         try:
             selection = int(input("\nSelect player number (or 0 to cancel): "))
             if selection == 0:
-                conn.close()
                 return None
             if 1 <= selection <= len(players):
                 break
@@ -43,157 +39,132 @@ def search_player():
             print("Please enter a number.")
     
     selected_player_id = players[selection-1][0]
-    conn.close()
     return selected_player_id
 
+PLAYER_SELECT = f"SELECT {', '.join(PLAYER_FIELDS)} FROM players"
+
+PA_SELECT = f"SELECT {', '.join('pa.' + field for field in PA_FIELDS)} FROM plate_appearances pa"
+
 def get_player_by_id(player_id):
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    
-    c.execute('''
-        SELECT playerID, playerName, team, batType, pitchType, pitchBonus, 
-               hand, priPos, secPos, tertPos, redditName, discordName, 
-               discordID, status, posValue
-        FROM players 
-        WHERE playerID = ?
-    ''', (player_id,))
-    
-    player_data = c.fetchone()
-    conn.close()
-    
-    if not player_data:
-        return None
-    
-    return Player(
-        player_data[0],  # playerID
-        player_data[1],  # playerName
-        player_data[2],  # team
-        player_data[3],  # batType
-        player_data[4],  # pitchType
-        player_data[5],  # pitchBonus
-        player_data[6],  # hand
-        player_data[7],  # priPos
-        player_data[8],  # secPos
-        player_data[9],  # tertPos
-        player_data[10], # redditName
-        player_data[11], # discordName
-        player_data[12], # discordID
-        player_data[13], # status
-        player_data[14]  # posValue
-    )
+    with db.reader() as conn:
+        c = conn.cursor()
+        c.row_factory = player_row_factory
+        c.execute(PLAYER_SELECT + ' WHERE playerID = ?', (player_id,))
+        return c.fetchone()
+
+def get_team_player_ids(team):
+    """IDs of the stored players on a team, read fresh from the players table"""
+    with db.reader() as conn:
+        c = conn.cursor()
+        c.execute('SELECT playerID FROM players WHERE team = ?', (team,))
+        return [row[0] for row in c.fetchall()]
+
+def get_plate_appearances(where, params=()):
+    """PlateAppearances matching a WHERE clause over plate_appearances pa, newest session first"""
+    with db.reader() as conn:
+        c = conn.cursor()
+        # Set on the cursor, not the connection, so other users of the pooled
+        # connection still get plain tuples
+        c.row_factory = plate_appearance_row_factory
+        c.execute(f'{PA_SELECT} WHERE {where} ORDER BY pa.season DESC, pa.session DESC', params)
+        return c.fetchall()
+
+ROLE_COLUMNS = {'batting': 'hitterID', 'pitching': 'pitcherID'}
+
+# Columns held by the idx_pa_*_columns indexes (paID comes free as the rowid).
+# Queries that only use these are answered from the index alone.
+INDEXED_COLUMNS = ('paID', 'season', 'session', 'gameID', 'pitch', 'swing', 'diff',
+                   'inning', 'outs', 'obc', 'hitterID', 'pitcherID')
+SITUATION_COLUMNS = ('inning', 'outs', 'obc')
+ANALYSIS_COLUMNS = ('paID', 'gameID', 'pitch', 'swing', 'diff')
+
+_row_types = {}
+
+def row_type(columns):
+    """A named tuple type for rows of the given columns, made once per column list"""
+    columns = tuple(columns)
+    if columns not in _row_types:
+        _row_types[columns] = namedtuple('PARow', columns)
+    return _row_types[columns]
+
+def query_plate_appearances(player_ids, role, columns=ANALYSIS_COLUMNS, seasons=None, game_ids=None,
+                            situation=None):
+    """Selected columns of a player's 'batting' or 'pitching' PAs, newest session first.
+    
+    player_ids is one ID or a list of them. seasons is an inclusive (first, last)
+    range where either end may be None, game_ids limits the result to those
+    games and situation maps SITUATION_COLUMNS to required values, e.g.
+    {'outs': 2, 'obc': '0'}. Rows are named tuples of just the requested columns;
+    keep to INDEXED_COLUMNS and the query is served by a covering index.
+    """
+    columns = tuple(columns)
+    unknown = [column for column in columns if column not in PA_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown plate appearance columns: {', '.join(unknown)}")
+    if isinstance(player_ids, int):
+        player_ids = [player_ids]
+    player_ids = list(player_ids)
+    
+    where = [f"pa.{ROLE_COLUMNS[role]} IN ({', '.join('?' * len(player_ids))})",
+             "pa.pa_type IN ('pitching', 'batting')"]
+    params = player_ids
+    if seasons is not None:
+        first, last = seasons
+        if first is not None:
+            where.append('pa.season >= ?')
+            params.append(first)
+        if last is not None:
+            where.append('pa.season <= ?')
+            params.append(last)
+    if game_ids is not None:
+        game_ids = list(game_ids)
+        where.append(f"pa.gameID IN ({', '.join('?' * len(game_ids))})")
+        params += game_ids
+    for column, value in (situation or {}).items():
+        if column not in SITUATION_COLUMNS:
+            raise ValueError(f"Unknown situation column: {column}")
+        where.append(f'pa.{column} = ?')
+        params.append(value)
+    
+    Row = row_type(columns)
+    with db.reader() as conn:
+        c = conn.cursor()
+        c.row_factory = lambda cursor, row: Row._make(row)
+        c.execute(f'''
+            SELECT {', '.join('pa.' + column for column in columns)}
+            FROM plate_appearances pa
+            WHERE {' AND '.join(where)}
+            ORDER BY pa.season DESC, pa.session DESC
+        ''', params)
+        return c.fetchall()
 
 def get_player_batting_pas_by_id(player_id):
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    
-    c.execute('''
-        SELECT 
-            pa.paID, pa.league, pa.season, pa.session, pa.gameID,
-            pa.inning, pa.inningID, pa.playNumber, pa.outs, pa.obc,
-            pa.awayScore, pa.homeScore, pa.pitcherTeam, pa.pitcherName,
-            pa.pitcherID, pa.hitterTeam, pa.hitterName, pa.hitterID,
-            pa.pitch, pa.swing, pa.diff, pa.exactResult, pa.oldResult,
-            pa.resultAtNeutral, pa.resultAllNeutral, pa.rbi, pa.run,
-            pa.batterWPA, pa.pitcherWPA, pa.pr3B, pa.pr2B, pa.pr1B, pa.prAB
-        FROM plate_appearances pa
-        WHERE pa.hitterID = ? AND (pa.pa_type = 'pitching' OR pa.pa_type = 'batting')
-        ORDER BY pa.season DESC, pa.session DESC
-    ''', (player_id,))
-    
-    pas_data = c.fetchall()
-    conn.close()
-    
-    return [PlateAppearance(
-        pa[0], pa[1], pa[2], pa[3], pa[4],    # paID, league, season, session, gameID
-        pa[5], pa[6], pa[7], pa[8], pa[9],    # inning, inningID, playNumber, outs, obc
-        pa[10], pa[11], pa[12], pa[13], pa[14], # awayScore, homeScore, pitcherTeam, pitcherName, pitcherID
-        pa[15], pa[16], pa[17], pa[18], pa[19], # hitterTeam, hitterName, hitterID, pitch, swing
-        pa[20], pa[21], pa[22], pa[23], pa[24], # diff, exactResult, oldResult, resultAtNeutral, resultAllNeutral
-        pa[25], pa[26], pa[27], pa[28], pa[29], # rbi, run, batterWPA, pitcherWPA, pr3B
-        pa[30], pa[31], pa[32]                  # pr2B, pr1B, prAB
-    ) for pa in pas_data]
+    return get_plate_appearances(
+        "pa.hitterID = ? AND (pa.pa_type = 'pitching' OR pa.pa_type = 'batting')", (player_id,))
 
 def get_player_pitching_pas_by_id(player_id):
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    
-    c.execute('''
-        SELECT 
-            pa.paID, pa.league, pa.season, pa.session, pa.gameID,
-            pa.inning, pa.inningID, pa.playNumber, pa.outs, pa.obc,
-            pa.awayScore, pa.homeScore, pa.pitcherTeam, pa.pitcherName,
-            pa.pitcherID, pa.hitterTeam, pa.hitterName, pa.hitterID,
-            pa.pitch, pa.swing, pa.diff, pa.exactResult, pa.oldResult,
-            pa.resultAtNeutral, pa.resultAllNeutral, pa.rbi, pa.run,
-            pa.batterWPA, pa.pitcherWPA, pa.pr3B, pa.pr2B, pa.pr1B, pa.prAB
-        FROM plate_appearances pa
-        WHERE pa.pitcherID = ? AND (pa.pa_type = 'pitching' OR pa.pa_type = 'batting')
-        ORDER BY pa.season DESC, pa.session DESC
-    ''', (player_id,))
-    
-    pas_data = c.fetchall()
-    conn.close()
-    
-    return [PlateAppearance(
-        pa[0], pa[1], pa[2], pa[3], pa[4],    # paID, league, season, session, gameID
-        pa[5], pa[6], pa[7], pa[8], pa[9],    # inning, inningID, playNumber, outs, obc
-        pa[10], pa[11], pa[12], pa[13], pa[14], # awayScore, homeScore, pitcherTeam, pitcherName, pitcherID
-        pa[15], pa[16], pa[17], pa[18], pa[19], # hitterTeam, hitterName, hitterID, pitch, swing
-        pa[20], pa[21], pa[22], pa[23], pa[24], # diff, exactResult, oldResult, resultAtNeutral, resultAllNeutral
-        pa[25], pa[26], pa[27], pa[28], pa[29], # rbi, run, batterWPA, pitcherWPA, pr3B
-        pa[30], pa[31], pa[32]                  # pr2B, pr1B, prAB
-    ) for pa in pas_data]
+    return get_plate_appearances(
+        "pa.pitcherID = ? AND (pa.pa_type = 'pitching' OR pa.pa_type = 'batting')", (player_id,))
 
 def get_player_stealing_pas_by_id(player_id):
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    
-    c.execute('''
-        SELECT 
-            pa.paID, pa.league, pa.season, pa.session, pa.gameID,
-            pa.inning, pa.inningID, pa.playNumber, pa.outs, pa.obc,
-            pa.awayScore, pa.homeScore, pa.pitcherTeam, pa.pitcherName,
-            pa.pitcherID, pa.hitterTeam, pa.hitterName, pa.hitterID,
-            pa.pitch, pa.swing, pa.diff, pa.exactResult, pa.oldResult,
-            pa.resultAtNeutral, pa.resultAllNeutral, pa.rbi, pa.run,
-            pa.batterWPA, pa.pitcherWPA, pa.pr3B, pa.pr2B, pa.pr1B, pa.prAB
-        FROM plate_appearances pa
-        WHERE (
-            (pa.pr3B = ? AND pa.resultAtNeutral LIKE '%steal%') OR
-            (pa.pr2B = ? AND pa.resultAtNeutral LIKE '%steal%') OR
-            (pa.pr1B = ? AND pa.resultAtNeutral LIKE '%steal%')
-        )
-        ORDER BY pa.season DESC, pa.session DESC
-    ''', (player_id, player_id, player_id))
-    
-    pas_data = c.fetchall()
-    conn.close()
-    
-    return [PlateAppearance(
-        pa[0], pa[1], pa[2], pa[3], pa[4],    # paID, league, season, session, gameID
-        pa[5], pa[6], pa[7], pa[8], pa[9],    # inning, inningID, playNumber, outs, obc
-        pa[10], pa[11], pa[12], pa[13], pa[14], # awayScore, homeScore, pitcherTeam, pitcherName, pitcherID
-        pa[15], pa[16], pa[17], pa[18], pa[19], # hitterTeam, hitterName, hitterID, pitch, swing
-        pa[20], pa[21], pa[22], pa[23], pa[24], # diff, exactResult, oldResult, resultAtNeutral, resultAllNeutral
-        pa[25], pa[26], pa[27], pa[28], pa[29], # rbi, run, batterWPA, pitcherWPA, pr3B
-        pa[30], pa[31], pa[32]                  # pr2B, pr1B, prAB
-    ) for pa in pas_data]
+    return get_plate_appearances('''(
+                (pa.pr3B = ? AND pa.resultAtNeutral LIKE '%steal%') OR
+                (pa.pr2B = ? AND pa.resultAtNeutral LIKE '%steal%') OR
+                (pa.pr1B = ? AND pa.resultAtNeutral LIKE '%steal%')
+            )''', (player_id, player_id, player_id))
 
 def search_player_by_name(name):
     """Search for a player by name and return their ID"""
-    conn = sqlite3.connect('baseball.db')
-    c = conn.cursor()
-    
     # Search for players with similar names using LIKE
-    c.execute('''
-        SELECT playerID, playerName, team 
-        FROM players 
-        WHERE playerName LIKE ? 
-        LIMIT 1
-    ''', (f'%{name}%',))
-    
-    player = c.fetchone()
-    conn.close()
+    with db.reader() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT playerID, playerName, team 
+            FROM players 
+            WHERE playerName LIKE ? 
+            LIMIT 1
+        ''', (f'%{name}%',))
+        player = c.fetchone()
     
     if not player:
         return None
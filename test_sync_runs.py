@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+import getData
+
+class UnfinishedRunTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(os.path.join(self.tmp.name, 'baseball.db'), isolation_level=None)
+        getData._create_tables(self.conn)
+        getData.migrate(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def add_run(self, owner, heartbeat="datetime('now')"):
+        c = self.conn.execute(f'''
+            INSERT INTO sync_runs (incremental, started, owner, heartbeat)
+            VALUES (1, datetime('now'), ?, {heartbeat})
+        ''', (owner,))
+        return c.lastrowid
+
+    def dead_owner(self):
+        # A pid on this host that has exited
+        child = subprocess.Popen([sys.executable, '-c', 'pass'])
+        child.wait()
+        return f'{getData.socket.gethostname()}:{child.pid}'
+
+    def test_run_with_recent_heartbeat_is_live(self):
+        run_id = self.add_run(getData.sync_owner())
+        self.assertEqual(getData.get_unfinished_run(self.conn), (run_id, getData.sync_owner(), True))
+        self.assertFalse(getData.claim_sync_run(run_id, getData.sync_owner(), self.conn))
+
+    def test_dead_owner_on_this_host_is_stale_straight_away(self):
+        owner = self.dead_owner()
+        run_id = self.add_run(owner)
+        self.assertEqual(getData.get_unfinished_run(self.conn), (run_id, owner, False))
+        self.assertTrue(getData.claim_sync_run(run_id, owner, self.conn))
+        self.assertEqual(getData.get_unfinished_run(self.conn), (run_id, getData.sync_owner(), True))
+
+    def test_owner_on_another_host_waits_for_the_heartbeat(self):
+        run_id = self.add_run('elsewhere:1')
+        self.assertTrue(getData.get_unfinished_run(self.conn)[2])
+        self.conn.execute("UPDATE sync_runs SET heartbeat = datetime('now', '-10 minutes')")
+        self.assertFalse(getData.get_unfinished_run(self.conn)[2])
+        self.assertTrue(getData.claim_sync_run(run_id, 'elsewhere:1', self.conn))
+
+    def test_claim_fails_once_someone_else_took_over(self):
+        owner = self.dead_owner()
+        run_id = self.add_run(owner)
+        self.assertTrue(getData.claim_sync_run(run_id, owner, self.conn))
+        self.assertFalse(getData.claim_sync_run(run_id, owner, self.conn))
+
+if __name__ == '__main__':
+    unittest.main()